@@ -16,6 +16,8 @@ interface AuthContextType {
 }
 
 
+const REFRESH_URL = '/backend/auth/jwt/refresh';
+
 const AuthContext = createContext<AuthContextType | undefined>(undefined);
 
 const save_users_to_local_storage = (users: Map<string, User>) => {
@@ -55,7 +57,7 @@ const is_token_expired = (token: string): boolean => {
 
 const restore_logged_users = (): Map<string, User> => {
   const users = get_users_from_local_storage();
-  const valid_users = users.filter((user) => !is_token_expired(user.token));
+  const valid_users = users.filter((user) => !is_token_expired(user.refresh_token ?? user.token));
 //  console.log("Valid users:", valid_users);
   return new Map(valid_users.map(user => [user.email, user]));
 };
@@ -72,7 +74,16 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
 //      console.log("3 Setting axios token:", active_user.token);
 
       const interceptor = axios.interceptors.request.use(
-        (config) => {
+        async (config) => {
+          // Access tokens are short-lived, renew them before they are rejected
+          if (config.url !== REFRESH_URL && is_token_expired(active_user.token) && active_user.refresh_token) {
+            const refreshed = await axios.post(REFRESH_URL, {
+              refresh_token: active_user.refresh_token,
+            });
+            active_user.token = refreshed.data.access_token;
+            active_user.refresh_token = refreshed.data.refresh_token;
+            setUsers((users) => new Map(users).set(active_user.email, active_user));
+          }
           config.headers["Authorization"] = `Bearer ${active_user.token}`;
           return config;
         },
@@ -109,6 +120,7 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
       });
 
       const auth_token = loginInfo.data.access_token;
+      const refresh_token = loginInfo.data.refresh_token;
       const user_response = await axios.get('/backend/api/v1/users/me', {
         headers: { Authorization: `Bearer ${auth_token}` },
       });
@@ -120,6 +132,7 @@ export const AuthProvider = ({ children }: { children: ReactNode }) => {
 
       const current_user = user_response.data;
       current_user.token = auth_token;
+      current_user.refresh_token = refresh_token;
       const updated_users = new Map(users);
       updated_users.set(current_user.email, current_user);
 
@@ -12,6 +12,7 @@ export interface User
   id: string;
   name: string;
   token: string;
+  refresh_token?: string;
   email: string;
   is_superuser: boolean;
 }
@@ -0,0 +1,56 @@
+"""unique chore history per week
+
+Revision ID: c4e2a9b71d03
+Revises: 8d5a1f0e6c27
+Create Date: 2026-10-18 14:00:37.551820
+
+"""
+from datetime import timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e2a9b71d03'
+down_revision: Union[str, None] = '8d5a1f0e6c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A chore archived twice under the same week was reset to that same week the first time, so
+    # each later entry belongs to a following week. Move them to the next weeks still free for
+    # the chore instead of dropping any history.
+    conn = op.get_bind()
+    entries = conn.execute(sa.text("""
+        SELECT id, chore_id, week_start_date FROM chore_history
+        WHERE chore_id IN (
+            SELECT chore_id FROM chore_history GROUP BY chore_id, week_start_date HAVING count(*) > 1
+        )
+        ORDER BY chore_id, week_start_date, expired_at, id
+    """)).all()
+
+    weeks_by_chore = {}
+    for entry in entries:
+        weeks_by_chore.setdefault(entry.chore_id, set()).add(entry.week_start_date)
+
+    kept = set()
+    for entry in entries:
+        if (entry.chore_id, entry.week_start_date) not in kept:
+            kept.add((entry.chore_id, entry.week_start_date))
+            continue
+        taken = weeks_by_chore[entry.chore_id]
+        week_start_date = entry.week_start_date + timedelta(days=7)
+        while week_start_date in taken:
+            week_start_date += timedelta(days=7)
+        taken.add(week_start_date)
+        kept.add((entry.chore_id, week_start_date))
+        conn.execute(sa.text("UPDATE chore_history SET week_start_date = :week_start_date WHERE id = :id"),
+                     {"week_start_date": week_start_date, "id": entry.id})
+    op.create_unique_constraint('uq_chore_history_chore_week', 'chore_history', ['chore_id', 'week_start_date'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_chore_history_chore_week', 'chore_history', type_='unique')
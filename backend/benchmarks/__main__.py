@@ -0,0 +1,77 @@
+"""
+Benchmarks for the scoring, week rollover and login paths.
+
+    python -m backend.benchmarks run --output bench.json
+    python -m backend.benchmarks compare baseline.json bench.json
+    python -m backend.benchmarks plans --database-url postgresql+asyncpg://.../scratch
+    python -m backend.benchmarks plans --migrated --database-url postgresql+asyncpg://.../scratch
+"""
+import argparse
+import asyncio
+import sys
+
+from .login import run_login_benchmarks
+from .query_plans import check_migrated_schema, check_query_plans, report_query_plans, report_schema_differences
+from .rollover import run_rollover_benchmarks
+from .runner import BenchmarkReport, compare_reports, write_report
+from .scoring import run_scoring_benchmarks
+
+
+def parse_counts(value: str) -> list[int]:
+    return [int(count) for count in value.split(",")]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Run the benchmarks and write the results as JSON")
+    run.add_argument("--output", default="benchmark_results.json")
+    run.add_argument("--chores", type=parse_counts, default=[5, 50, 500], help="Comma separated chore counts")
+    run.add_argument("--users", type=parse_counts, default=[1, 10], help="Comma separated user counts")
+    run.add_argument("--batches", type=parse_counts, default=[100, 1000], help="Comma separated score_many sizes")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--logins", type=parse_counts, default=[8, 32], help="Comma separated login burst sizes")
+    run.add_argument("--skip-rollover", action="store_true", help="Only run the in-memory scoring benchmarks")
+    run.add_argument("--skip-login", action="store_true", help="Skip the login burst benchmarks")
+
+    compare = subparsers.add_parser("compare", help="Compare two result files")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--threshold", type=float, default=0.10,
+                         help="Relative slowdown of the median that counts as a regression")
+
+    plans = subparsers.add_parser("plans", help="Fail if a repository query scans a table sequentially")
+    plans.add_argument("--database-url", default="sqlite+aiosqlite://",
+                       help="Scratch database to seed, its tables are dropped afterwards")
+    plans.add_argument("--verbose", action="store_true", help="Print every plan")
+    plans.add_argument("--migrated", action="store_true",
+                       help="Use the schema of a database migrated with alembic upgrade head, after "
+                            "checking it matches the models, instead of creating it from the models")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        return 0 if compare_reports(args.baseline, args.candidate, args.threshold) else 1
+
+    if args.command == "plans":
+        ok = True
+        if args.migrated:
+            ok = report_schema_differences(asyncio.run(check_migrated_schema(args.database_url)))
+        query_plans = asyncio.run(check_query_plans(args.database_url, migrated=args.migrated))
+        return 0 if report_query_plans(query_plans, args.verbose) and ok else 1
+
+    report = BenchmarkReport(metadata={"argv": sys.argv[1:]})
+    run_scoring_benchmarks(report, args.chores, args.batches, args.repeat)
+    if not args.skip_rollover:
+        asyncio.run(run_rollover_benchmarks(report, args.chores, args.users, args.repeat))
+    if not args.skip_login:
+        asyncio.run(run_login_benchmarks(report, args.logins))
+    write_report(report, args.output)
+    print(f"Wrote {len(report.results)} results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
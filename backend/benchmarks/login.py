@@ -0,0 +1,88 @@
+"""
+Login burst benchmark.
+
+Runs a burst of concurrent logins while a probe keeps running an unrelated chores lookup,
+and reports the latency of the probe. With the password hashed on the event loop the probe
+waits for every hash in the burst, with the hashing offloaded it only waits for the database.
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users import BaseUserManager
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from ..chore_repository import ChoreRepository
+from ..models import Base, Chore, User
+from ..passwords import OffloadedPasswordHelper
+from ..reward_calculator import WEEKDAYS
+from ..user_repository import CachedUserDatabase, UserManager
+from .runner import BenchmarkReport, _summarize
+from .scoring import STATUSES
+
+PASSWORD = "Benchmark1"
+
+
+async def run_login_benchmarks(report: BenchmarkReport, login_counts: list[int], workers: int = 4,
+                               seed_value: int = 0):
+    """
+    Times the probe lookup during every login burst, once with the passwords verified on the
+    event loop ("inline") and once on the password helper thread pool ("executor")
+    """
+    rng = random.Random(seed_value)
+    password_helper = OffloadedPasswordHelper(workers=workers)
+    hashed_password = password_helper.hash(PASSWORD)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # A file database, so the logins and the probe each get their own connection
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'login.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        emails = [f"login{u}@example.com" for u in range(max(login_counts))]
+        probe_user_id = uuid.uuid4()
+        async with session_maker() as session:
+            session.add(User(id=probe_user_id, email="probe@example.com", hashed_password=hashed_password))
+            session.add_all(User(email=email, hashed_password=hashed_password) for email in emails)
+            session.add_all(Chore(name=f"chore {c}", user_id=probe_user_id,
+                                  statuses={day: rng.choice(STATUSES) for day in WEEKDAYS}) for c in range(10))
+            await session.commit()
+
+        async def login(email: str, inline: bool):
+            async with session_maker() as session:
+                manager = UserManager(CachedUserDatabase(session, User), password_helper)
+                credentials = OAuth2PasswordRequestForm(username=email, password=PASSWORD)
+                if inline:
+                    user = await BaseUserManager.authenticate(manager, credentials)
+                else:
+                    user = await manager.authenticate(credentials)
+                assert user is not None
+
+        for logins in login_counts:
+            for hashing in ("inline", "executor"):
+                inline = hashing == "inline"
+                timings = []
+
+                async with session_maker() as session:
+                    chores = ChoreRepository(session)
+                    # Check out the probe connection before the logins take the rest of the pool
+                    await chores.get_by_user_id(probe_user_id)
+                    burst = asyncio.gather(*(login(email, inline) for email in emails[:logins]))
+                    while True:
+                        start = time.perf_counter()
+                        await chores.get_by_user_id(probe_user_id)
+                        timings.append(time.perf_counter() - start)
+                        if burst.done():
+                            break
+                        await asyncio.sleep(0.001)
+                    await burst
+                report.add(_summarize("login_burst_probe_lookup", {"logins": logins, "hashing": hashing},
+                                      timings, 1))
+
+        password_helper.shutdown()
+        await engine.dispose()
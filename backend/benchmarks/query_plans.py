@@ -0,0 +1,261 @@
+"""
+Query plan regression checks.
+
+Seeds a scratch database, runs every repository lookup while recording the SQL it emits,
+then EXPLAINs each statement and fails if any of them reads a table sequentially.
+On PostgreSQL sequential scans are disabled for the EXPLAIN so the planner picks an
+index whenever one can serve the query, whatever the size of the seeded tables.
+
+By default the schema is created from the models. With migrated the database must already
+be at the Alembic head, so the plans are those of the migrated schema, and the schema is
+first compared with the models to catch migrations and models that drifted apart.
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+import random
+import re
+import uuid
+from typing import Awaitable, Callable
+
+from sqlalchemy import delete, event, insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from ..chore_repository import ChoreHistoryRepository, ChoreRepository
+from ..database import schema_is_current
+from ..models import (Base, Chore, ChoreHistory, Reward, User, UserFamily, UserWeekScores, get_current_week_start,
+                      user_family_association)
+from ..reward_calculator import WEEKDAYS
+from ..reward_repository import RewardRepository
+from ..score_repository import WeekScoresRepository
+from ..user_repository import FamilyRepository
+from .scoring import STATUSES
+
+SQLITE_TABLE_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+@dataclass
+class SeededIds:
+    user_id: uuid.UUID
+    other_user_ids: list[uuid.UUID]
+    chore_ids: list[uuid.UUID]
+    family_id: uuid.UUID
+
+
+@dataclass
+class QueryPlan:
+    name: str
+    statement: str
+    plan: list[str]
+    sequential_scans: list[str] = field(default_factory=list)
+
+
+async def seed(session: AsyncSession, users: int, chores: int, weeks: int, rng: random.Random) -> SeededIds:
+    week_start = get_current_week_start()
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    family_id = uuid.uuid4()
+    chore_rows, history_rows = [], []
+    for user_id in user_ids:
+        for c in range(chores):
+            chore_id = uuid.uuid4()
+            chore_rows.append({"id": chore_id, "name": f"chore {c}", "user_id": user_id, "week_start_date": week_start,
+                               "statuses": {day: rng.choice(STATUSES) for day in WEEKDAYS}})
+            for w in range(1, weeks + 1):
+                history_rows.append({"id": uuid.uuid4(), "chore_id": chore_id, "user_id": user_id,
+                                     "week_start_date": week_start - timedelta(weeks=w),
+                                     "statuses": {day: rng.choice(STATUSES) for day in WEEKDAYS}})
+
+    await session.execute(insert(User), [
+        {"id": user_id, "email": f"plan{u}@example.com", "hashed_password": "x", "name": f"plan {u}"}
+        for u, user_id in enumerate(user_ids)
+    ])
+    await session.execute(insert(UserFamily), [{"id": family_id, "name": "plans", "created_by_id": user_ids[0]}])
+    await session.execute(insert(user_family_association), [
+        {"user_id": user_id, "family_id": family_id} for user_id in user_ids[:4]
+    ])
+    await session.execute(insert(Reward), [{"id": uuid.uuid4(), "user_id": user_id} for user_id in user_ids])
+    await session.execute(insert(Chore), chore_rows)
+    await session.execute(insert(ChoreHistory), history_rows)
+    await session.execute(insert(UserWeekScores), [
+        {"id": uuid.uuid4(), "user_id": user_id, "week_start_date": week_start, "chore_ids": [], "table": [],
+         "scores": {}}
+        for user_id in user_ids
+    ])
+    await session.commit()
+    return SeededIds(user_id=user_ids[0],
+                     other_user_ids=user_ids[1:4],
+                     chore_ids=[row["id"] for row in chore_rows[:chores]],
+                     family_id=family_id)
+
+
+def repository_queries(session: AsyncSession, ids: SeededIds) -> dict[str, Callable[[], Awaitable]]:
+    """
+    Returns the repository lookups to check, by name
+    """
+    chores = ChoreRepository(session)
+    history = ChoreHistoryRepository(session)
+    rewards = RewardRepository(session)
+    families = FamilyRepository(session)
+    week_scores = WeekScoresRepository(session)
+    week_start = get_current_week_start()
+    user_ids = [ids.user_id, *ids.other_user_ids]
+
+    return {
+        "ChoreRepository.get_by_id": lambda: chores.get_by_id(ids.chore_ids[0]),
+        "ChoreRepository.get_by_user_id": lambda: chores.get_by_user_id(ids.user_id),
+        "ChoreRepository.get_by_user_ids": lambda: chores.get_by_user_ids(user_ids),
+        "ChoreRepository.get_due_user_ids": lambda: chores.get_due_user_ids(week_start),
+        "ChoreRepository.lock_user_chores_due": lambda: chores.lock_user_chores_due(ids.user_id, week_start),
+        "ChoreRepository.lock_user_chores": lambda: chores.lock_user_chores(ids.user_id),
+        "ChoreRepository.get_by_ids": lambda: chores.get_by_ids(ids.chore_ids),
+        "ChoreRepository.get_owned_ids": lambda: chores.get_owned_ids(ids.user_id, ids.chore_ids),
+        "ChoreHistoryRepository.get_by_user_id_and_week":
+            lambda: history.get_by_user_id_and_week(ids.user_id, week_start - timedelta(weeks=1)),
+        "ChoreHistoryRepository.get_archived_user_ids":
+            lambda: history.get_archived_user_ids(user_ids, week_start - timedelta(weeks=1)),
+        "ChoreHistoryRepository.get_page": lambda: history.get_page(ids.user_id, 20),
+        "RewardRepository.get_single_by_user_id": lambda: rewards.get_single_by_user_id(ids.user_id),
+        "FamilyRepository.get_user_families": lambda: families.get_user_families(ids.user_id),
+        "FamilyRepository.get_member_ids": lambda: families.get_member_ids(ids.family_id),
+        "FamilyRepository.get_user_family_ids": lambda: families.get_user_family_ids(ids.user_id),
+        "FamilyRepository.shares_family": lambda: families.shares_family(ids.user_id, ids.other_user_ids[0]),
+        "FamilyRepository.get_members_among": lambda: families.get_members_among(ids.user_id, ids.other_user_ids),
+        "WeekScoresRepository.get_by_user_id_and_week":
+            lambda: week_scores.get_by_user_id_and_week(ids.user_id, week_start),
+    }
+
+
+async def record_statements(engine: AsyncEngine, query: Callable[[], Awaitable]) -> list[tuple[str, tuple]]:
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        await query()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+async def explain(engine: AsyncEngine, name: str, statement: str, parameters: tuple) -> QueryPlan:
+    async with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            result = await conn.exec_driver_sql("EXPLAIN " + statement, parameters)
+            plan = [row[0] for row in result]
+            sequential_scans = [line.strip() for line in plan if "Seq Scan" in line]
+        else:
+            result = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+            plan = [row[-1] for row in result]
+            sequential_scans = [line for line in plan if SQLITE_TABLE_SCAN.match(line)]
+        await conn.rollback()
+    return QueryPlan(name=name, statement=statement, plan=plan, sequential_scans=sequential_scans)
+
+
+async def schema_differences(engine: AsyncEngine) -> list:
+    """
+    Returns how the schema of the database differs from the models, as Alembic autogenerate
+    sees it, an empty list when they match
+    """
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+
+    def compare(conn):
+        # SQLite reflects UUID columns as NUMERIC, only PostgreSQL has types worth comparing
+        opts = {"compare_type": conn.dialect.name == "postgresql"}
+        return compare_metadata(MigrationContext.configure(conn, opts=opts), Base.metadata)
+
+    async with engine.connect() as conn:
+        return await conn.run_sync(compare)
+
+
+async def check_migrated_schema(database_url: str) -> list:
+    """
+    Returns the differences between a database migrated to the Alembic head and the models
+    """
+    engine = create_async_engine(database_url)
+    try:
+        if not await schema_is_current(engine):
+            raise RuntimeError(f"{database_url} is not at the Alembic head, run alembic upgrade head first")
+        return await schema_differences(engine)
+    finally:
+        await engine.dispose()
+
+
+async def check_query_plans(database_url: str = "sqlite+aiosqlite://",
+                            users: int = 50,
+                            chores: int = 10,
+                            weeks: int = 12,
+                            seed_value: int = 0,
+                            migrated: bool = False) -> list[QueryPlan]:
+    """
+    Creates the schema in database_url, which must be a scratch database as all tables are
+    dropped afterwards, and returns the plan of every statement the repository lookups run.
+
+    With migrated the schema of the database is used as is and only the seeded rows are
+    deleted afterwards.
+    """
+    if database_url.startswith("sqlite"):
+        engine = create_async_engine(database_url, poolclass=StaticPool)
+    else:
+        engine = create_async_engine(database_url)
+    if migrated:
+        if not await schema_is_current(engine):
+            await engine.dispose()
+            raise RuntimeError(f"{database_url} is not at the Alembic head, run alembic upgrade head first")
+    else:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    plans = []
+    try:
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_maker() as session:
+            ids = await seed(session, users, chores, weeks, random.Random(seed_value))
+
+        async with session_maker() as session:
+            for name, query in repository_queries(session, ids).items():
+                for statement, parameters in await record_statements(engine, query):
+                    plans.append(await explain(engine, name, statement, parameters))
+                await session.rollback()
+    finally:
+        async with engine.begin() as conn:
+            if migrated:
+                for table in reversed(Base.metadata.sorted_tables):
+                    await conn.execute(delete(table))
+            else:
+                await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+    return plans
+
+
+def report_schema_differences(differences: list) -> bool:
+    """
+    Prints every difference between the migrated schema and the models, returns whether there are none
+    """
+    for difference in differences:
+        print(f"SCHEMA    {difference}")
+    if not differences:
+        print("ok        migrated schema matches the models")
+    return not differences
+
+
+def report_query_plans(plans: list[QueryPlan], verbose: bool = False) -> bool:
+    """
+    Prints the outcome of every plan and returns whether none of them scans a table
+    """
+    ok = True
+    for plan in plans:
+        if plan.sequential_scans:
+            ok = False
+            print(f"SEQ SCAN  {plan.name}: {'; '.join(plan.sequential_scans)}")
+            print(f"          {' '.join(plan.statement.split())}")
+        else:
+            print(f"ok        {plan.name}")
+        if verbose:
+            for line in plan.plan:
+                print(f"          | {line}")
+    return ok
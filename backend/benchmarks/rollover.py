@@ -0,0 +1,63 @@
+import random
+import uuid
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from ..chore_repository import ChoreHistoryRepository, ChoreRepository
+from ..models import Base, Chore, ChoreHistory, Reward, RewardTransaction, User
+from ..reward_calculator import WEEKDAYS, archive_and_reset_user_chores
+from ..reward_repository import RewardRepository
+from .runner import BenchmarkReport, time_async
+from .scoring import STATUSES
+
+
+async def seed(session: AsyncSession, users: int, chores: int, rng: random.Random) -> list[uuid.UUID]:
+    user_ids = []
+    for u in range(users):
+        user = User(id=uuid.uuid4(), email=f"bench{u}@example.com", hashed_password="x", name=f"bench {u}")
+        session.add(user)
+        user_ids.append(user.id)
+        for c in range(chores):
+            session.add(Chore(name=f"chore {c}", user_id=user.id,
+                              statuses={day: rng.choice(STATUSES) for day in WEEKDAYS}))
+    await session.commit()
+    return user_ids
+
+
+async def run_rollover_benchmarks(report: BenchmarkReport, chore_counts: list[int], user_counts: list[int],
+                                  repeat: int, seed_value: int = 0):
+    """
+    Times archive_and_reset_user_chores for every user against an in-process aiosqlite database
+    """
+    rng = random.Random(seed_value)
+
+    for users in user_counts:
+        for chores in chore_counts:
+            engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+            async with session_maker() as session:
+                user_ids = await seed(session, users, chores, rng)
+
+            async def reset():
+                async with session_maker() as session:
+                    await session.execute(delete(ChoreHistory))
+                    await session.execute(delete(Reward))
+                    await session.execute(delete(RewardTransaction))
+                    await session.commit()
+
+            async def rollover():
+                async with session_maker() as session:
+                    for user_id in user_ids:
+                        await archive_and_reset_user_chores(user_id,
+                                                            ChoreRepository(session),
+                                                            ChoreHistoryRepository(session),
+                                                            RewardRepository(session))
+
+            report.add(await time_async("archive_and_reset_user_chores", {"users": users, "chores": chores},
+                                        rollover, setup=reset, repeat=repeat))
+            await engine.dispose()
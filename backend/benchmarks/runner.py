@@ -0,0 +1,131 @@
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+import json
+import platform
+import statistics
+import subprocess
+import time
+from typing import Any, Awaitable, Callable
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    params: dict[str, Any]
+    repeat: int
+    number: int
+    # seconds per call
+    mean: float
+    median: float
+    best: float
+    stdev: float
+    # missing from reports written before it was added
+    p99: float = 0.0
+
+    @property
+    def key(self) -> str:
+        params = ",".join(f"{key}={value}" for key, value in sorted(self.params.items()))
+        return f"{self.name}[{params}]"
+
+
+@dataclass
+class BenchmarkReport:
+    results: list[BenchmarkResult] = field(default_factory=list)
+    metadata: dict[str, Any] = field(default_factory=dict)
+
+    def add(self, result: BenchmarkResult):
+        print(f"{result.key:<70} {result.median * 1e6:>12.1f} us  p99 {result.p99 * 1e6:>12.1f} us")
+        self.results.append(result)
+
+
+def _summarize(name: str, params: dict[str, Any], timings: list[float], number: int) -> BenchmarkResult:
+    per_call = [timing / number for timing in timings]
+    return BenchmarkResult(
+        name=name,
+        params=params,
+        repeat=len(per_call),
+        number=number,
+        mean=statistics.fmean(per_call),
+        median=statistics.median(per_call),
+        best=min(per_call),
+        stdev=statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        p99=statistics.quantiles(per_call, n=100)[98] if len(per_call) > 1 else per_call[0],
+    )
+
+
+def time_sync(name: str, params: dict[str, Any], func: Callable[[], Any],
+              repeat: int = 5, number: int = 100) -> BenchmarkResult:
+    """
+    Times func, number calls per sample and repeat samples
+    """
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append(time.perf_counter() - start)
+    return _summarize(name, params, timings, number)
+
+
+async def time_async(name: str, params: dict[str, Any], func: Callable[[], Awaitable[Any]],
+                     setup: Callable[[], Awaitable[Any]] | None = None,
+                     repeat: int = 5) -> BenchmarkResult:
+    """
+    Times one awaited call of func per sample, running setup untimed before every sample
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            await setup()
+        start = time.perf_counter()
+        await func()
+        timings.append(time.perf_counter() - start)
+    return _summarize(name, params, timings, 1)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(report: BenchmarkReport, path: str):
+    report.metadata.setdefault("created_at", datetime.now(UTC).isoformat())
+    report.metadata.setdefault("git_revision", git_revision())
+    report.metadata.setdefault("python", platform.python_version())
+    report.metadata.setdefault("machine", platform.machine())
+    with open(path, "w") as f:
+        json.dump({"metadata": report.metadata,
+                   "results": [{"key": result.key, **asdict(result)} for result in report.results]},
+                  f, indent=2)
+
+
+def load_report(path: str) -> dict[str, dict[str, Any]]:
+    with open(path) as f:
+        data = json.load(f)
+    return {result["key"]: result for result in data["results"]}
+
+
+def compare_reports(baseline_path: str, candidate_path: str, threshold: float = 0.10) -> bool:
+    """
+    Prints the change in median time of every benchmark present in both reports.
+
+    Returns False if any benchmark got slower by more than threshold (a fraction).
+    """
+    baseline = load_report(baseline_path)
+    candidate = load_report(candidate_path)
+    ok = True
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key]["median"], candidate[key]["median"]
+        change = (after - before) / before if before else 0.0
+        regressed = change > threshold
+        ok = ok and not regressed
+        marker = "REGRESSED" if regressed else ""
+        print(f"{key:<70} {before * 1e6:>12.1f} -> {after * 1e6:>12.1f} us {change:>+8.1%} {marker}")
+
+    for key in sorted(baseline.keys() - candidate.keys()):
+        print(f"{key:<70} missing from {candidate_path}")
+    return ok
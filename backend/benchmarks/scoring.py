@@ -0,0 +1,59 @@
+import random
+import uuid
+
+from ..models import Chore, ChoreTable
+from ..reward_calculator import (SCORING_ENGINES, WEEKDAYS, calculate_reward_times, make_chore_result,
+                                 score_many)
+from .runner import BenchmarkReport, time_sync
+
+
+STATUSES = ["X", "X", "O", "_"]
+
+
+def random_table(rows: int, rng: random.Random) -> ChoreTable:
+    return ChoreTable(table=[[rng.choice(STATUSES) for _ in WEEKDAYS] for _ in range(rows)])
+
+
+def check_engines_agree(tables: list[ChoreTable]):
+    """
+    Every scoring engine and the batch scorer must produce the same scores
+    """
+    reference = [SCORING_ENGINES["reference"](table) for table in tables]
+    for name, engine in SCORING_ENGINES.items():
+        if [engine(table) for table in tables] != reference:
+            raise AssertionError(f"Scoring engine '{name}' disagrees with the reference engine")
+    if score_many(tables) != reference:
+        raise AssertionError("score_many disagrees with the reference engine")
+
+
+def run_scoring_benchmarks(report: BenchmarkReport, chore_counts: list[int], batch_sizes: list[int],
+                           repeat: int, seed: int = 0):
+    rng = random.Random(seed)
+
+    for chores in chore_counts:
+        table = random_table(chores, rng)
+        check_engines_agree([table] + [random_table(chores, rng) for _ in range(20)])
+        number = max(1, 2000 // chores)
+
+        for name, engine in SCORING_ENGINES.items():
+            report.add(time_sync("find_regularities", {"engine": name, "chores": chores},
+                                 lambda: engine(table), repeat=repeat, number=number))
+
+        unscored = SCORING_ENGINES["reference"](table)
+        report.add(time_sync("calculate_reward_times", {"chores": chores},
+                             lambda: calculate_reward_times(unscored.model_copy(update={"total_minutes": 0})),
+                             repeat=repeat, number=number * 10))
+
+        user_id = uuid.uuid4()
+        chore_rows = [Chore(id=uuid.uuid4(), name=f"chore {i}", statuses=dict(zip(WEEKDAYS, row)), user_id=user_id)
+                      for i, row in enumerate(table.table)]
+        report.add(time_sync("make_chore_result", {"chores": chores},
+                             lambda: make_chore_result(chore_rows), repeat=repeat, number=number))
+
+    for tables in batch_sizes:
+        batch = [random_table(rng.randint(1, 15), rng) for _ in range(tables)]
+        report.add(time_sync("score_many", {"tables": tables},
+                             lambda: score_many(batch), repeat=repeat, number=1))
+        report.add(time_sync("score_each", {"tables": tables},
+                             lambda: [SCORING_ENGINES["reference"](table) for table in batch],
+                             repeat=repeat, number=1))
@@ -1,16 +1,46 @@
-from datetime import date
-from typing import Iterable
+import base64
+import binascii
+from datetime import date, datetime
+import json
+from typing import AsyncIterator, Iterable, Optional
+import uuid
 
 from fastapi import Depends
-from sqlalchemy import and_
+from sqlalchemy import JSON, Text, and_, case, cast, func, insert, literal, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from .database import get_async_session
+from .database import get_async_session, get_read_session
 from .models import Chore, ChoreHistory
 from .repository import BaseRepository
 
+ARCHIVE_CHUNK_SIZE = 1000
+HISTORY_PAGE_SIZE = 100
+
+HistoryCursor = tuple[date, uuid.UUID]
+
+
+def history_cursor(entry: ChoreHistory) -> HistoryCursor:
+    return entry.week_start_date, entry.id
+
+
+def encode_history_cursor(cursor: HistoryCursor) -> str:
+    week_start_date, entry_id = cursor
+    return base64.urlsafe_b64encode(f"{week_start_date.isoformat()}/{entry_id}".encode()).decode()
+
+
+def decode_history_cursor(token: str) -> HistoryCursor:
+    """
+    Parses a cursor returned by encode_history_cursor, raising ValueError if it is malformed
+    """
+    try:
+        week_start_date, entry_id = base64.urlsafe_b64decode(token.encode()).decode().split("/")
+        return date.fromisoformat(week_start_date), uuid.UUID(entry_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {token!r}") from e
+
 
 class ChoreRepository(BaseRepository[Chore]):
     @property
@@ -22,6 +52,138 @@ class ChoreRepository(BaseRepository[Chore]):
         entities = result.scalars().all()
         return entities
 
+    async def get_by_user_ids(self, user_ids: Iterable[UUID]) -> dict[UUID, list[Chore]]:
+        """
+        Fetches the chores of many users in one query, grouped by user
+        """
+        result = await self.session.execute(select(self.model).filter(self.model.user_id.in_(list(user_ids))))
+        chores_by_user: dict[UUID, list[Chore]] = {}
+        for chore in result.scalars():
+            chores_by_user.setdefault(chore.user_id, []).append(chore)
+        return chores_by_user
+
+    async def get_by_ids(self, chore_ids: list[UUID]) -> list[Chore]:
+        """
+        Reads the chores again from the database, in the order of chore_ids, skipping deleted ones
+        """
+        result = await self.session.scalars(select(self.model).filter(self.model.id.in_(chore_ids)),
+                                            execution_options={"populate_existing": True})
+        return self._in_order(result.all(), chore_ids)
+
+    async def get_user_ids(self) -> list[UUID]:
+        """
+        Returns every user that has at least one chore
+        """
+        result = await self.session.execute(select(self.model.user_id).distinct())
+        return list(result.scalars().all())
+
+    async def get_owned_ids(self, user_id: UUID, chore_ids: Iterable[UUID]) -> set[UUID]:
+        """
+        Returns which of the given chores belong to the user, in one query
+        """
+        result = await self.session.execute(
+            select(self.model.id).filter(and_(self.model.id.in_(list(chore_ids)), self.model.user_id == user_id))
+        )
+        return set(result.scalars().all())
+
+    async def update_statuses(self, user_id: UUID, changes: dict[UUID, dict[str, str]]) -> list[Chore]:
+        """
+        Applies per-weekday status changes to many of the user's chores in one statement.
+
+        changes maps a chore id to the new status of each weekday that changes. The changes
+        are applied as JSON path updates inside the database, so rows are never read first.
+        """
+        if not changes:
+            return []
+
+        dialect = self.session.get_bind().dialect
+        new_statuses = {}
+        for chore_id, day_statuses in changes.items():
+            if dialect.name == "postgresql":
+                statuses = cast(self.model.statuses, postgresql.JSONB)
+                for day, status in day_statuses.items():
+                    statuses = func.jsonb_set(statuses,
+                                              cast(literal("{" + day + "}"), postgresql.ARRAY(Text)),
+                                              cast(literal(json.dumps(status)), postgresql.JSONB))
+                new_statuses[chore_id] = cast(statuses, JSON)
+            elif dialect.name == "sqlite":
+                path_values = []
+                for day, status in day_statuses.items():
+                    path_values += [f"$.{day}", status]
+                new_statuses[chore_id] = func.json_set(self.model.statuses, *path_values, type_=JSON)
+            else:
+                return await self._update_statuses_in_python(user_id, changes)
+
+        stmt = (
+            update(self.model)
+            .where(and_(self.model.id.in_(list(changes)), self.model.user_id == user_id))
+            .values(statuses=case(new_statuses, value=self.model.id, else_=self.model.statuses))
+        )
+        result = await self.session.scalars(stmt.returning(self.model),
+                                            execution_options={"populate_existing": True,
+                                                               "synchronize_session": False})
+        chores = self._in_order(result.all(), list(changes))
+        await self.session.commit()
+        return chores
+
+    async def _update_statuses_in_python(self, user_id: UUID, changes: dict[UUID, dict[str, str]]) -> list[Chore]:
+        result = await self.session.execute(
+            select(self.model).filter(and_(self.model.id.in_(list(changes)), self.model.user_id == user_id))
+        )
+        chores = result.scalars().all()
+        return await self.update_many(
+            {"id": chore.id, "statuses": {**chore.statuses, **changes[chore.id]}} for chore in chores
+        )
+
+    async def get_due_user_ids(self, week_start_date: date) -> list[UUID]:
+        """
+        Returns the users that still have chores from before the given week
+        """
+        result = await self.session.execute(
+            select(self.model.user_id).distinct().filter(self.model.week_start_date < week_start_date)
+        )
+        return list(result.scalars().all())
+
+    async def lock_user_chores_due(self, user_id: UUID, week_start_date: date) -> Iterable[Chore]:
+        """
+        Locks the user's chores from before the given week for the rest of the transaction.
+
+        Rows another transaction holds are skipped rather than waited on, so concurrent
+        workers never roll over the same chores.
+        """
+        result = await self.session.execute(
+            select(self.model)
+            .filter(and_(self.model.user_id == user_id, self.model.week_start_date < week_start_date))
+            .with_for_update(skip_locked=True)
+        )
+        return result.scalars().all()
+
+    async def lock_user_chores(self, user_id: UUID) -> list[Chore]:
+        """
+        Reads all of the user's chores again and locks them for the rest of the transaction,
+        waiting for transactions that hold them
+        """
+        result = await self.session.scalars(
+            select(self.model).filter(self.model.user_id == user_id).with_for_update(),
+            execution_options={"populate_existing": True}
+        )
+        return list(result.all())
+
+    async def reset_user_chores(self,
+                                user_id: UUID,
+                                statuses: dict[str, str],
+                                week_start_date: date,
+                                chore_ids: Optional[Iterable[UUID]] = None) -> None:
+        """
+        Sets the statuses and week of the user's chores in a single statement, without committing.
+
+        Resets all of them unless limited to chore_ids.
+        """
+        stmt = update(self.model).where(self.model.user_id == user_id)
+        if chore_ids is not None:
+            stmt = stmt.where(self.model.id.in_(list(chore_ids)))
+        await self.session.execute(stmt.values(statuses=statuses, week_start_date=week_start_date))
+
 
 class ChoreHistoryRepository(BaseRepository[ChoreHistory]):
     @property
@@ -33,6 +195,46 @@ class ChoreHistoryRepository(BaseRepository[ChoreHistory]):
         entities = result.scalars().all()
         return entities
 
+    async def get_page(self,
+                       user_id: UUID,
+                       limit: int,
+                       after: Optional[HistoryCursor] = None,
+                       from_week: Optional[date] = None,
+                       to_week: Optional[date] = None) -> list[ChoreHistory]:
+        """
+        Returns up to limit history entries of the user, newest week first.
+
+        Pages are keyed on (week_start_date, id) so each page is an index range scan that
+        starts right after the last entry of the previous page, whatever its depth.
+        """
+        stmt = select(self.model).filter(self.model.user_id == user_id)
+        if from_week is not None:
+            stmt = stmt.filter(self.model.week_start_date >= from_week)
+        if to_week is not None:
+            stmt = stmt.filter(self.model.week_start_date <= to_week)
+        if after is not None:
+            stmt = stmt.filter(tuple_(self.model.week_start_date, self.model.id) < tuple_(*after))
+        stmt = stmt.order_by(self.model.week_start_date.desc(), self.model.id.desc()).limit(limit)
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def iter_pages(self,
+                         user_id: UUID,
+                         page_size: int = HISTORY_PAGE_SIZE,
+                         from_week: Optional[date] = None,
+                         to_week: Optional[date] = None) -> AsyncIterator[list[ChoreHistory]]:
+        """
+        Yields all history entries of the user page by page, newest week first
+        """
+        after = None
+        while True:
+            page = await self.get_page(user_id, page_size, after=after, from_week=from_week, to_week=to_week)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after = history_cursor(page[-1])
+
     async def get_by_user_id_and_week(self, user_id: UUID, week_start_date: date) -> Iterable[ChoreHistory]:
         result = await self.session.execute(
             select(self.model).filter(
@@ -44,6 +246,59 @@ class ChoreHistoryRepository(BaseRepository[ChoreHistory]):
         )
         return result.scalars().all()
 
+    async def get_archived_user_ids(self, user_ids: Iterable[UUID], week_start_date: date) -> set[UUID]:
+        """
+        Returns which of the given users already have chores archived for the week
+        """
+        result = await self.session.execute(
+            select(self.model.user_id).distinct().filter(
+                and_(
+                    self.model.user_id.in_(list(user_ids)),
+                    self.model.week_start_date == week_start_date
+                )
+            )
+        )
+        return set(result.scalars().all())
+
+    async def archive_chores(self, chores: Iterable[Chore], expired_at: datetime) -> int:
+        """
+        Inserts a history entry for every chore in bulk, without committing.
+
+        Chores that already have an entry for their week are skipped, relying on the
+        unique (chore_id, week_start_date) constraint. Returns how many entries were inserted.
+        """
+        rows = [
+            {
+                "chore_id": chore.id,
+                "user_id": chore.user_id,
+                "week_start_date": chore.week_start_date,
+                "statuses": chore.statuses,
+                "expired_at": expired_at,
+                "reward_func": chore.reward_func,
+            }
+            for chore in chores
+        ]
+        inserted = 0
+        for start in range(0, len(rows), ARCHIVE_CHUNK_SIZE):
+            stmt = self._insert_skipping_archived(rows[start:start + ARCHIVE_CHUNK_SIZE])
+            result = await self.session.execute(stmt)
+            inserted += len(result.scalars().all())
+        return inserted
+
+    def _insert_skipping_archived(self, rows: list[dict]):
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            stmt = postgresql.insert(self.model).values(rows).on_conflict_do_nothing(
+                index_elements=["chore_id", "week_start_date"]
+            )
+        elif dialect == "sqlite":
+            stmt = sqlite.insert(self.model).values(rows).on_conflict_do_nothing(
+                index_elements=["chore_id", "week_start_date"]
+            )
+        else:
+            # No conflict clause, a duplicate fails the whole transaction instead
+            stmt = insert(self.model).values(rows)
+        return stmt.returning(self.model.chore_id)
 
 
 async def get_chore_db(session: AsyncSession = Depends(get_async_session)):
@@ -52,3 +307,11 @@ async def get_chore_db(session: AsyncSession = Depends(get_async_session)):
 
 async def get_chore_history_db(session: AsyncSession = Depends(get_async_session)):
     yield ChoreHistoryRepository(session)
+
+
+async def get_chore_read_db(session: AsyncSession = Depends(get_read_session)):
+    yield ChoreRepository(session)
+
+
+async def get_chore_history_read_db(session: AsyncSession = Depends(get_read_session)):
+    yield ChoreHistoryRepository(session)
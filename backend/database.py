@@ -1,33 +1,221 @@
 from dataclasses import dataclass
-from typing import AsyncGenerator
+from functools import cache
+import math
+import os
+import time
+from typing import Any, AsyncGenerator, Optional
 
+from fastapi import Request, Response
+from pydantic import BaseModel
+from sqlalchemy import event, exc, make_url, text
 from sqlalchemy.ext.asyncio import (AsyncEngine, AsyncSession, async_sessionmaker,
                                     create_async_engine)
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 
 from .models import Base, Chore, ChoreHistory, Reward, User
+from .query_stats import track_queries
+from .settings import DailyDriveSettings
+
+
+class PoolStats(BaseModel):
+    pool_class: str
+    size: int = 0
+    checked_out: int = 0
+    idle: int = 0
+    overflow: int = 0
+    max_overflow: int = 0
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long checkouts wait for a connection
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+def engine_options(db_url: str, settings: DailyDriveSettings) -> dict[str, Any]:
+    """
+    Returns the create_async_engine arguments for the pool settings
+    """
+    url = make_url(db_url)
+    options: dict[str, Any] = {"pool_pre_ping": settings.db_pool_pre_ping}
+    if url.get_backend_name() == "postgresql" and url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": settings.db_prepared_statement_cache_size}
+
+    if settings.db_null_pool:
+        # An external pooler such as PgBouncer owns the connections
+        options["poolclass"] = NullPool
+    elif url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In memory databases live in a single connection, keep SQLAlchemy's pool for them
+        pass
+    else:
+        options.update(poolclass=TimedAsyncQueuePool,
+                       pool_size=settings.db_pool_size,
+                       max_overflow=settings.db_max_overflow,
+                       pool_timeout=settings.db_pool_timeout_seconds,
+                       pool_recycle=settings.db_pool_recycle_seconds)
+    return options
+
+
+# Cookie carrying the time of the client's last write, so any process serving its next
+# requests knows to read from the primary
+LAST_WRITE_COOKIE = "daily_drive_last_write"
+
+
+def note_write(session: Session):
+    """
+    Records on the response that the request wrote, once per session
+    """
+    response = session.info.get("response")
+    if response is None or session.info.get("wrote"):
+        return
+    session.info["wrote"] = True
+    window = db_state.read_your_writes_seconds
+    response.set_cookie(LAST_WRITE_COOKIE, f"{time.time():.3f}", max_age=max(math.ceil(window), 1),
+                        httponly=True, samesite="lax")
+
+
+@event.listens_for(Session, "after_flush")
+def _note_flush(session: Session, flush_context):
+    note_write(session)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_execute(orm_execute_state: ORMExecuteState):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        note_write(orm_execute_state.session)
+
+
+def wrote_recently(request: Request) -> bool:
+    """
+    Returns whether the client of the request wrote within read_your_writes_seconds
+    """
+    try:
+        written_at = float(request.cookies.get(LAST_WRITE_COOKIE, ""))
+    except ValueError:
+        return False
+    return time.time() - written_at < db_state.read_your_writes_seconds
 
 
 @dataclass
 class DBState:
     engine: AsyncEngine | None
     async_session_maker: async_sessionmaker | None
+    read_engine: AsyncEngine | None = None
+    read_session_maker: async_sessionmaker | None = None
+    read_your_writes_seconds: float = 5.0
 
-    def init(self, db_url: str):
+    def init(self, db_url: str, settings: Optional[DailyDriveSettings] = None):
+        settings = settings or DailyDriveSettings()
         print(f"Database URL: {db_url}")
-        self.engine = create_async_engine(db_url)
+        self.engine = create_async_engine(db_url, **engine_options(db_url, settings))
+        track_queries(self.engine)
         self.async_session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
 
+        if settings.read_replica_url:
+            print(f"Read replica URL: {settings.read_replica_url}")
+            self.read_engine = create_async_engine(settings.read_replica_url,
+                                                   **engine_options(settings.read_replica_url, settings))
+            track_queries(self.read_engine)
+            self.read_session_maker = async_sessionmaker(self.read_engine, expire_on_commit=False)
+        self.read_your_writes_seconds = settings.read_your_writes_seconds
+
+    def pool_stats(self) -> PoolStats:
+        assert self.engine is not None
+        pool = self.engine.pool
+        stats = PoolStats(pool_class=type(pool).__name__)
+        if isinstance(pool, QueuePool):
+            stats.size = pool.size()
+            stats.checked_out = pool.checkedout()
+            stats.idle = pool.checkedin()
+            stats.overflow = max(pool.overflow(), 0)
+            stats.max_overflow = pool._max_overflow
+        if isinstance(pool, TimedAsyncQueuePool):
+            stats.checkouts = pool.checkouts
+            stats.timeouts = pool.timeouts
+            stats.wait_seconds_total = pool.wait_seconds_total
+            stats.wait_seconds_max = pool.wait_seconds_max
+        return stats
+
 
 db_state = DBState(None, None)
 
 
+@cache
+def alembic_heads() -> frozenset[str]:
+    """
+    Returns the head revisions of the migration scripts, read once per process
+    """
+    from alembic.script import ScriptDirectory
+
+    return frozenset(ScriptDirectory(os.path.join(os.path.dirname(__file__), "alembic")).get_heads())
+
+
+async def schema_is_current(engine: AsyncEngine) -> bool:
+    """
+    Returns whether the database has been migrated to the head revision
+    """
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+            revisions = frozenset(result.scalars().all())
+    except exc.DBAPIError:
+        # No alembic_version table, the schema was never migrated
+        return False
+    return revisions == alembic_heads()
+
+
 async def create_db_and_tables():
     assert db_state.engine is not None
     async with db_state.engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+async def get_async_session(response: Response) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session on the primary. A request that writes through it sets the last write cookie, so
+    the client keeps reading from the primary for a while, see get_read_session.
+    """
     assert db_state.async_session_maker is not None
     async with db_state.async_session_maker() as session:
+        session.sync_session.info["response"] = response
+        yield session
+
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session on the read replica when one is configured, for read only routes.
+
+    Clients whose last write cookie is younger than read_your_writes_seconds get the primary
+    instead, so they see their own writes despite replication lag, whichever process wrote.
+    """
+    session_maker = db_state.read_session_maker
+    if session_maker is None or wrote_recently(request):
+        session_maker = db_state.async_session_maker
+    assert session_maker is not None
+    async with session_maker() as session:
         yield session
@@ -1,9 +1,10 @@
-from typing import Annotated, cast
+from typing import Annotated, Optional, cast
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.datastructures import State
 
-from .state import DailyDriveState, current_active_user
 from .models import User
+from .state import DailyDriveState, bearer_transport, current_superuser
+from .user_repository import TokenClaims, decode_token_claims
 
 
 def get_state(request: Request) -> State:
@@ -16,9 +17,33 @@ def get_daily_drive_state(state: Annotated[State, Depends(get_state)]) -> DailyD
     return cast(DailyDriveState, state.daily_drive_state)
 
 
-def superuser_required(user: User = Depends(current_active_user)) -> User:
-    if not user.is_superuser:
+def current_claims(token: Optional[str] = Depends(bearer_transport.scheme)) -> TokenClaims:
+    """
+    Authorizes from the claims of the access token alone, without loading the user.
+
+    A user deactivated or demoted since the token was issued keeps its claims until the
+    token expires, use current_active_user where that matters.
+    """
+    claims = decode_token_claims(token) if token else None
+    if claims is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    return claims
+
+
+def superuser_required(user: User = Depends(current_superuser)) -> User:
+    """
+    Authorizes superusers from the database, for routes that change data, so a superuser
+    demoted or deactivated since their token was issued is refused right away
+    """
+    return user
+
+
+def superuser_claims_required(claims: TokenClaims = Depends(current_claims)) -> TokenClaims:
+    """
+    Authorizes superusers from the claims of the access token alone, for read-only routes
+    """
+    if not claims.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="You do not have sufficient privileges"
         )
-    return user
+    return claims
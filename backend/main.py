@@ -1,5 +1,7 @@
+from datetime import date
+from enum import Enum
 import logging
-from typing import Annotated, List, Optional
+from typing import Annotated, List, Literal, Optional
 from uuid import UUID
 from operator import add, sub
 
@@ -9,14 +11,27 @@ from fastapi_users import InvalidID, InvalidPasswordException
 from fastapi_users.exceptions import FastAPIUsersException
 from pydantic import BaseModel
 
-from .chore_repository import ChoreRepository, ChoreHistoryRepository, get_chore_db, get_chore_history_db
-from .state import lifespan, current_active_user
-from .dependencies import superuser_required
-from .models import ChoreTable, CurrentReward, Reward, UiChore, UiUser, User, UserFamily, UserRewardScores
-from .reward_calculator import ChoresResult, find_regularities_with_locations, archive_and_reset_user_chores
-from .reward_repository import RewardRepository, get_reward_db
-from .user_repository import (FamilyErrorCode, FamilyRepository, FamilyResult, UserCreate, UserManager,
-                              get_family_repo, get_user_manager, make_family_error, make_family_result)
+from .chore_repository import (HISTORY_PAGE_SIZE, ChoreRepository, ChoreHistoryRepository, decode_history_cursor,
+                               encode_history_cursor, get_chore_db, get_chore_history_db, get_chore_history_read_db,
+                               get_chore_read_db, history_cursor)
+from .state import DailyDriveState, auth_backend, include_auth_routers, lifespan, current_active_user
+from .dependencies import current_claims, get_daily_drive_state, superuser_claims_required, superuser_required
+from .models import (ChoreHistoryPage, ChoreTable, CurrentReward, UiChore, UiUser, User, UserFamily, UserRewardScores,
+                     UserRewardSummary, WeekScores, WeekScoresDrift, WeekScoresSummary, get_current_week_start)
+from .database import PoolStats, db_state
+from .reward_calculator import (BatchRolloverResult, ChoresResult, apply_reward_rules, archive_and_reset_many,
+                                archive_and_reset_user_chores, check_week_scores, rebuild_week_scores,
+                                reward_rule_minutes, summarize_table, update_week_scores_for_chore,
+                                update_week_scores_for_chores)
+from .query_stats import QueryStatsMiddleware
+from .reward_rules import RewardRuleError, RewardRuleStats, reward_rules
+from .reward_repository import REWARD_COLUMNS, RewardRepository, get_reward_db, get_reward_read_db
+from .score_cache import ScoresCacheStats
+from .score_repository import WeekScoresRepository, get_week_scores_db
+from .user_cache import UserCacheStats, user_cache
+from .user_repository import (BearerRefreshResponse, CachingJWTStrategy, FamilyErrorCode, FamilyRepository, FamilyResult,
+                              TokenClaims, UserCreate, UserManager, get_family_read_repo, get_family_repo,
+                              get_jwt_strategy, get_user_manager, make_family_error, make_family_result)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,11 +42,11 @@ OP_MAP = {
     "subtract": sub
 }
 
-MAX_TV_TIME = 60 * 28
-MAX_GAME_TIME = 60 * 28
+MAX_HISTORY_PAGE_SIZE = 500
 
 
 app = FastAPI(lifespan=lifespan, title="Daily Drive", version="0.1.0", redirect_slashes=False)
+include_auth_routers(app)
 
 app.add_middleware(
     CORSMiddleware,
@@ -39,84 +54,314 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Queries", "X-DB-Time"],
 )
+app.add_middleware(QueryStatsMiddleware)
+
+
+async def check_same_family(caller_id: UUID, user_id: UUID, family_repo: FamilyRepository):
+    """
+    Allows acting on another user only if they share a family with the caller. Memberships are
+    read from the database, the families in the token may be stale.
+    """
+    if user_id != caller_id and not await family_repo.shares_family(caller_id, user_id):
+        raise HTTPException(status_code=403, detail="The user is not a member of your family")
+
+
+def validate_reward_func(reward_func: Optional[str]):
+    try:
+        reward_rules.validate(reward_func)
+    except RewardRuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def chore_values(chore: UiChore, user: User) -> dict:
+    """
+    Returns the fields of a chore sent by the user to store. Only superusers set reward rules,
+    the reward_func sent by anyone else is ignored and the stored one kept.
+    """
+    if not user.is_superuser:
+        return chore.model_dump(exclude_unset=True, exclude={"reward_func"})
+    validate_reward_func(chore.reward_func)
+    return chore.model_dump(exclude_unset=True)
 
 
 @app.get("/api/v1/chores", response_model=List[UiChore], tags=["chores"])
 async def get_chores(
-                     user: Annotated[User, Depends(current_active_user)],
-                     chore_repo: ChoreRepository = Depends(get_chore_db),):
-    logger.info("Getting all chores for user: %s", user.id)
-    return await chore_repo.get_by_user_id(user.id)
+                     claims: Annotated[TokenClaims, Depends(current_claims)],
+                     chore_repo: ChoreRepository = Depends(get_chore_read_db),):
+    logger.info("Getting all chores for user: %s", claims.user_id)
+    return await chore_repo.get_by_user_id(claims.user_id)
 
 
 @app.post("/api/v1/chores", response_model=UiChore, tags=["chores"])
 async def add_chore(chore: UiChore,
                     chore_repo: ChoreRepository = Depends(get_chore_db),
+                    week_scores_repo: WeekScoresRepository = Depends(get_week_scores_db),
                     user=Depends(current_active_user)):
     logger.info(f"Adding a chore: {chore}")
     chore.user_id = user.id
-    return await chore_repo.add(chore.model_dump(exclude_unset=True))
+    new_chore = await chore_repo.add(chore_values(chore, user))
+    await rebuild_week_scores(user.id, chore_repo, week_scores_repo)
+    return new_chore
+
+
+@app.post("/api/v1/chores/batch", response_model=List[UiChore], tags=["chores"])
+async def add_chores(chores: List[UiChore],
+                     chore_repo: ChoreRepository = Depends(get_chore_db),
+                     week_scores_repo: WeekScoresRepository = Depends(get_week_scores_db),
+                     user=Depends(current_active_user)):
+    logger.info("Adding %d chores for user %s", len(chores), user.id)
+    for chore in chores:
+        chore.user_id = user.id
+    new_chores = await chore_repo.add_many([chore_values(chore, user) for chore in chores])
+    await rebuild_week_scores(user.id, chore_repo, week_scores_repo)
+    return new_chores
 
 
 @app.put("/api/v1/chores/{chore_id}", response_model=UiChore, tags=["chores"])
 async def update_chore(chore_id: UUID,
                        updated_chore: UiChore,
                        chore_repo: ChoreRepository = Depends(get_chore_db),
-                       user = Depends(current_active_user)):
+                       week_scores_repo: WeekScoresRepository = Depends(get_week_scores_db),
+                       user = Depends(current_active_user),
+                       state: DailyDriveState = Depends(get_daily_drive_state)):
     logger.info("Updating a chore for user %s", user.id)
     updated_chore.user_id = user.id
-    return await chore_repo.update(chore_id, updated_chore.model_dump())
+    chore = await chore_repo.update(chore_id, chore_values(updated_chore, user))
+    if chore is not None:
+        await update_week_scores_for_chore(chore, chore_repo, week_scores_repo,
+                                           verify=state.settings.week_scores_verify)
+    return chore
+
+
+class ChoreStatusChange(BaseModel):
+    chore_id: UUID
+    weekday: Literal["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    status: Literal["X", "O", "_"]
+
+
+@app.patch("/api/v1/chores/statuses", response_model=List[UiChore], tags=["chores"])
+async def update_chore_statuses(status_changes: List[ChoreStatusChange],
+                                chore_repo: ChoreRepository = Depends(get_chore_db),
+                                week_scores_repo: WeekScoresRepository = Depends(get_week_scores_db),
+                                user = Depends(current_active_user),
+                                state: DailyDriveState = Depends(get_daily_drive_state)):
+    logger.info("Updating %d chore statuses for user %s", len(status_changes), user.id)
+    changes: dict[UUID, dict[str, str]] = {}
+    for change in status_changes:
+        changes.setdefault(change.chore_id, {})[change.weekday] = change.status
+
+    owned_ids = await chore_repo.get_owned_ids(user.id, changes)
+    if owned_ids != set(changes):
+        raise HTTPException(status_code=404, detail="Chores not found")
+
+    chores = await chore_repo.update_statuses(user.id, changes)
+    if chores:
+        await update_week_scores_for_chores(user.id, chores, chore_repo, week_scores_repo,
+                                            verify=state.settings.week_scores_verify)
+    return chores
+
+
+@app.get("/api/v1/chores/history", response_model=ChoreHistoryPage, tags=["chores"])
+async def get_chore_history(cursor: Optional[str] = None,
+                            limit: Annotated[int, Query(ge=1, le=MAX_HISTORY_PAGE_SIZE)] = HISTORY_PAGE_SIZE,
+                            from_week: Optional[date] = None,
+                            to_week: Optional[date] = None,
+                            chore_history_repo: ChoreHistoryRepository = Depends(get_chore_history_read_db),
+                            claims: TokenClaims = Depends(current_claims)):
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_history_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # One extra row tells whether another page follows without a COUNT
+    entries = await chore_history_repo.get_page(claims.user_id, limit + 1, after=after, from_week=from_week, to_week=to_week)
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_history_cursor(history_cursor(entries[-1]))
+    return ChoreHistoryPage(items=entries, next_cursor=next_cursor)
 
 
 @app.delete("/api/v1/chores/{chore_id}", response_model=UiChore, tags=["chores"])
 async def delete_chore(chore_id: UUID,
                        chore_repo: ChoreRepository = Depends(get_chore_db),
+                       week_scores_repo: WeekScoresRepository = Depends(get_week_scores_db),
                        _ = Depends(current_active_user)):
     logger.info("Deleting a chore: %s", chore_id)
-    return await chore_repo.delete(chore_id)
+    chore = await chore_repo.delete(chore_id)
+    if chore is not None:
+        await rebuild_week_scores(chore.user_id, chore_repo, week_scores_repo)
+    return chore
 
 
 @app.post("/api/v1/end_week", tags=["chores"], dependencies=[Depends(superuser_required)])
 async def end_week(chore_repo: ChoreRepository = Depends(get_chore_db),
                    chore_history_repo: ChoreHistoryRepository = Depends(get_chore_history_db),
                    reward_repo: RewardRepository = Depends(get_reward_db),
-                   _ = Depends(current_active_user),
+                   week_scores_repo: WeekScoresRepository = Depends(get_week_scores_db),
+                   family_repo: FamilyRepository = Depends(get_family_repo),
+                   claims: TokenClaims = Depends(current_claims),
                    user_id: Optional[UUID] = Query(None, description="ID of the user to retrieve families for"),
                    ) -> ChoresResult:
-    # TODO: make sure that super user is a member of the family of the passed user_id
     print(f"Ending the week for user {user_id}")
     if user_id is None:
         raise HTTPException(status_code=400, detail="Please provide a user_id")
+    await check_same_family(claims.user_id, user_id, family_repo)
 
-    result = await archive_and_reset_user_chores(user_id, chore_repo, chore_history_repo, reward_repo)
+    result = await archive_and_reset_user_chores(user_id, chore_repo, chore_history_repo, reward_repo,
+                                                 week_scores_repo)
     print(f"{result=}")
     return result
 
 
+class ScoresDetail(str, Enum):
+    summary = "summary"
+    full = "full"
+
+
+@app.post("/api/v1/end_week/batch", tags=["chores"])
+async def end_week_batch(family_repo: Annotated[FamilyRepository, Depends(get_family_repo)],
+                         current_user: Annotated[User, Depends(superuser_required)],
+                         state: DailyDriveState = Depends(get_daily_drive_state),
+                         family_id: UUID = Query(..., description="ID of the family to end the week for"),
+                         ) -> BatchRolloverResult:
+    member_ids = await family_repo.get_member_ids(family_id)
+    if current_user.id not in member_ids:
+        raise HTTPException(status_code=403, detail="Only members of the family can end its week")
+
+    assert db_state.async_session_maker is not None
+    return await archive_and_reset_many(member_ids, db_state.async_session_maker,
+                                        concurrency=state.settings.rollover_concurrency)
+
+
 @app.post("/api/v1/get_scores", tags=["chores"])
 async def get_scores(chore_table: ChoreTable,
                      reward_repo: RewardRepository = Depends(get_reward_db),
-                     user = Depends(current_active_user)) -> UserRewardScores:
+                     week_scores_repo: WeekScoresRepository = Depends(get_week_scores_db),
+                     user = Depends(current_active_user),
+                     state: DailyDriveState = Depends(get_daily_drive_state),
+                     detail: ScoresDetail = Query(ScoresDetail.full,
+                                                  description="summary only returns the point and minute totals"),
+                     ) -> UserRewardScores | UserRewardSummary:
     print("Getting scores")
     print(chore_table)
-    week_scores = find_regularities_with_locations(chore_table)
-    current_reward = CurrentReward()
-    user_reward_score = UserRewardScores(scores=week_scores, reward=current_reward)
-
-    reward = await reward_repo.get_single_by_user_id(user.id)
-    if reward is not None:
-        user_reward_score.reward = CurrentReward(
-            star_points=reward.star_points,
-            tv_time_points=reward.tv_time_points,
-            game_time_points=reward.game_time_points
-        )
-        print(f"Found reward: {reward.star_points}, {reward.tv_time_points}, {reward.game_time_points}")
+    running = await week_scores_repo.get_by_user_id_and_week(user.id, get_current_week_start())
+    is_running_table = running is not None and running.table == chore_table.table
+
+    # Posted rows carry no chore ids, only the running table is known to line up with the
+    # user's chores and so with their rules, any other table is scored without rules
+    reward_funcs = running.reward_funcs if is_running_table else None
+
+    if detail == ScoresDetail.summary:
+        if is_running_table:
+            summary = WeekScoresSummary(total_points=running.scores["total_points"],
+                                        total_minutes=running.scores["total_minutes"])
+        else:
+            tally = summarize_table(chore_table)
+            summary = WeekScoresSummary(total_points=tally.total_points, total_minutes=tally.total_minutes)
+        summary.total_minutes += reward_rule_minutes(chore_table.table, reward_funcs)
+        return UserRewardSummary(scores=summary, reward=await get_current_reward(user.id, reward_repo))
 
+    if is_running_table:
+        week_scores = WeekScores.model_validate(running.scores)
+    else:
+        week_scores = state.scores_cache.get_scores(chore_table)
+    week_scores = apply_reward_rules(week_scores, chore_table.table, reward_funcs)
+    return await make_user_reward_scores(week_scores, user.id, reward_repo)
+
+
+async def get_current_reward(user_id: UUID, reward_repo: RewardRepository) -> CurrentReward:
+    reward = await reward_repo.get_single_by_user_id(user_id)
+    if reward is None:
+        return CurrentReward()
+
+    print(f"Found reward: {reward.star_points}, {reward.tv_time_points}, {reward.game_time_points}")
+    return CurrentReward(
+        star_points=reward.star_points,
+        tv_time_points=reward.tv_time_points,
+        game_time_points=reward.game_time_points
+    )
+
+
+async def make_user_reward_scores(week_scores: WeekScores,
+                                  user_id: UUID,
+                                  reward_repo: RewardRepository) -> UserRewardScores:
+    user_reward_score = UserRewardScores(scores=week_scores, reward=await get_current_reward(user_id, reward_repo))
     print(f"{user_reward_score=}")
     return user_reward_score
 
 
+@app.get("/api/v1/scores/current", tags=["chores"])
+async def get_current_scores(chore_repo: ChoreRepository = Depends(get_chore_db),
+                             reward_repo: RewardRepository = Depends(get_reward_db),
+                             week_scores_repo: WeekScoresRepository = Depends(get_week_scores_db),
+                             claims: TokenClaims = Depends(current_claims),
+                             detail: ScoresDetail = Query(ScoresDetail.full,
+                                                          description="summary only returns the point and minute totals"),
+                             ) -> UserRewardScores | UserRewardSummary:
+    user_id = claims.user_id
+    running = await week_scores_repo.get_by_user_id_and_week(user_id, get_current_week_start())
+    if running is None:
+        running = await rebuild_week_scores(user_id, chore_repo, week_scores_repo)
+
+    if detail == ScoresDetail.summary:
+        summary = WeekScoresSummary(
+            total_points=running.scores["total_points"],
+            total_minutes=running.scores["total_minutes"] + reward_rule_minutes(running.table, running.reward_funcs),
+        )
+        return UserRewardSummary(scores=summary, reward=await get_current_reward(user_id, reward_repo))
+
+    week_scores = apply_reward_rules(WeekScores.model_validate(running.scores), running.table, running.reward_funcs)
+    return await make_user_reward_scores(week_scores, user_id, reward_repo)
+
+
+@app.get("/api/v1/scores/consistency", tags=["chores"], dependencies=[Depends(superuser_required)])
+async def get_scores_consistency(chore_repo: ChoreRepository = Depends(get_chore_db),
+                                 week_scores_repo: WeekScoresRepository = Depends(get_week_scores_db),
+                                 user_id: UUID = Query(..., description="ID of the user to check the scores of"),
+                                 repair: bool = Query(False, description="Rebuild the stored scores on drift"),
+                                 ) -> WeekScoresDrift:
+    return await check_week_scores(user_id, chore_repo, week_scores_repo, repair=repair)
+
+
+@app.get("/api/v1/scores/cache", tags=["chores"], dependencies=[Depends(superuser_claims_required)])
+async def get_scores_cache_stats(state: DailyDriveState = Depends(get_daily_drive_state)) -> ScoresCacheStats:
+    return state.scores_cache.stats()
+
+
+@app.get("/api/v1/scores/rules", tags=["chores"], dependencies=[Depends(superuser_claims_required)])
+async def get_reward_rule_stats() -> List[RewardRuleStats]:
+    return reward_rules.stats()
+
+
+@app.get("/api/v1/db/pool", dependencies=[Depends(superuser_claims_required)])
+async def get_pool_stats(state: DailyDriveState = Depends(get_daily_drive_state)) -> PoolStats:
+    return state.db_state.pool_stats()
+
+
+@app.get("/api/v1/users/cache", tags=["users"], dependencies=[Depends(superuser_claims_required)])
+async def get_user_cache_stats() -> UserCacheStats:
+    return user_cache.stats()
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+@app.post("/auth/jwt/refresh", response_model=BearerRefreshResponse, tags=["auth"])
+async def refresh_access_token(refresh: RefreshRequest,
+                               strategy: CachingJWTStrategy = Depends(get_jwt_strategy),
+                               user_manager: UserManager = Depends(get_user_manager)):
+    user = await strategy.read_refresh_token(refresh.refresh_token, user_manager)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    return await auth_backend.token_response(strategy, user)
+
+
 @app.get("/api/v1/protected_route", tags=["users"])
 async def protected_route(user=Depends(current_active_user)):
     return {"message": f"Hello, {user.email}!"}
@@ -152,11 +397,11 @@ class UpdateResult(BaseModel):
     value: float | str
 
 
-@app.post("/api/v1/families", dependencies=[Depends(superuser_required)])
+@app.post("/api/v1/families")
 async def create_family(
     family_create: FamilyCreate,
     family_repo: Annotated[FamilyRepository, Depends(get_family_repo)],
-    current_user: Annotated[User, Depends(current_active_user)],
+    current_user: Annotated[User, Depends(superuser_required)],
 ) -> FamilyResult:
     new_family = UserFamily(name=family_create.name, created_by_id=current_user.id)
     new_family.members.append(current_user)
@@ -194,9 +439,9 @@ async def add_family_member(
         raise HTTPException(status_code=400, detail=e.__class__.__name__)
 
 
-@app.get("/api/v1/families", dependencies=[Depends(superuser_required)])
+@app.get("/api/v1/families", dependencies=[Depends(superuser_claims_required)])
 async def get_family(
-    family_repo: Annotated[FamilyRepository, Depends(get_family_repo)],
+    family_repo: Annotated[FamilyRepository, Depends(get_family_read_repo)],
     user_id: Optional[UUID] = Query(None, description="ID of the user to retrieve families for"),
     family_id: Optional[UUID] = Query(None, description="ID of the family to retrieve"),
 ) -> FamilyResult:
@@ -219,16 +464,18 @@ async def get_family(
 
 @app.get("/api/v1/rewards")
 async def get_rewards(
-    reward_repo: Annotated[RewardRepository, Depends(get_reward_db)],
-    current_user: Annotated[User, Depends(current_active_user)],
+    reward_repo: Annotated[RewardRepository, Depends(get_reward_read_db)],
+    family_repo: Annotated[FamilyRepository, Depends(get_family_read_repo)],
+    claims: Annotated[TokenClaims, Depends(current_claims)],
     user_id: Optional[UUID] = Query(None, description="ID of the user to retrieve rewards for"),
 ) -> CurrentReward:
 
-    # TODO: make sure that super user is a member of the family of the passed user_id
-    either_super_or_self = current_user.is_superuser or user_id == current_user.id
+    either_super_or_self = claims.is_superuser or user_id == claims.user_id
 
     if not either_super_or_self:
         raise HTTPException(status_code=403, detail="Only superusers or the user themselves can view rewards")
+    if user_id is not None:
+        await check_same_family(claims.user_id, user_id, family_repo)
 
     reward = await reward_repo.get_single_by_user_id(user_id)
     if reward is None:
@@ -242,41 +489,84 @@ async def get_rewards(
     )
 
 
+def check_reward_op(reward_op: RewardUpdate, user_id: UUID, is_superuser: bool):
+    if reward_op.operation == "add":
+        if not is_superuser:
+            raise HTTPException(status_code=403, detail="Only superusers can add rewards")
+    elif reward_op.operation == "subtract":
+        if not is_superuser and reward_op.target_user_id != user_id:
+            raise HTTPException(status_code=403, detail="Reward owners or superusers can subtract")
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown operation {reward_op.operation}")
+    if reward_op.reward not in REWARD_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Unknown reward {reward_op.reward}")
+
+
 @app.post("/api/v1/rewards/update")
 async def update_rewards(
     reward_op: RewardUpdate,
     reward_repo: Annotated[RewardRepository, Depends(get_reward_db)],
+    family_repo: Annotated[FamilyRepository, Depends(get_family_repo)],
     current_user: Annotated[User, Depends(current_active_user)],
 ) -> UpdateResult:
 
-    reward = await reward_repo.get_single_by_user_id(reward_op.target_user_id)
-    if reward is None:
-        print("User has no rewards, creating new reward")
-        reward = Reward(user_id=reward_op.target_user_id)
-        reward = await reward_repo.add_entity(reward)
+    check_reward_op(reward_op, current_user.id, current_user.is_superuser)
+    await check_same_family(current_user.id, reward_op.target_user_id, family_repo)
 
-    if reward_op.operation == "add":
-        if not current_user.is_superuser:
-            raise HTTPException(status_code=403, detail="Only superusers can add rewards")
-    elif reward_op.operation == "subtract":
-        if not current_user.is_superuser and reward_op.target_user_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Reward owners or superusers can subtract")
+    column = REWARD_COLUMNS[reward_op.reward]
+    amount = OP_MAP[reward_op.operation](0, reward_op.amount)
+    rewards = await reward_repo.add_to_balances({reward_op.target_user_id: {column: amount}}, kind="update",
+                                               created_by_id=current_user.id)
+    await reward_repo.session.commit()
+    return UpdateResult(value=getattr(rewards[reward_op.target_user_id], column))
 
-    result = UpdateResult(value=0)
-    if reward_op.reward == "star_points":
-        reward.star_points = OP_MAP[reward_op.operation](reward.star_points, reward_op.amount)
-        result.value = reward.star_points
-    elif reward_op.reward == "tv_time":
-        reward.tv_time_points = max(0, OP_MAP[reward_op.operation](reward.tv_time_points, reward_op.amount))
-        reward.tv_time_points = min(MAX_TV_TIME, reward.tv_time_points)
-        result.value = reward.tv_time_points
-    elif reward_op.reward == "game_time":
-        reward.game_time_points = max(0, OP_MAP[reward_op.operation](reward.game_time_points, reward_op.amount))
-        reward.game_time_points = min(MAX_GAME_TIME, reward.game_time_points)
-        result.value = reward.game_time_points
-
-    await reward_repo.update_entity(reward)
-    return result
+
+@app.post("/api/v1/rewards/batch")
+async def update_rewards_batch(
+    reward_ops: List[RewardUpdate],
+    reward_repo: Annotated[RewardRepository, Depends(get_reward_db)],
+    family_repo: Annotated[FamilyRepository, Depends(get_family_repo)],
+    current_user: Annotated[User, Depends(current_active_user)],
+) -> List[UpdateResult]:
+    """
+    Applies many reward updates in one transaction and returns the result of each, in order.
+
+    Every update is authorized like /api/v1/rewards/update, against the user loaded from the
+    database, and every other user targeted must share a family with the caller, before
+    anything is written. Updates of the same user and reward apply in order, the balances of
+    all users move in a single statement per such round, usually just one.
+    """
+    for reward_op in reward_ops:
+        check_reward_op(reward_op, current_user.id, current_user.is_superuser)
+    others = {reward_op.target_user_id for reward_op in reward_ops} - {current_user.id}
+    if others and await family_repo.get_members_among(current_user.id, others) != others:
+        raise HTTPException(status_code=403, detail="The user is not a member of your family")
+
+    # The n-th update of a user's reward goes in the n-th round
+    rounds: list[dict[UUID, dict[str, float]]] = []
+    placement: list[tuple[int, str]] = []
+    for reward_op in reward_ops:
+        column = REWARD_COLUMNS[reward_op.reward]
+        index = 0
+        while index < len(rounds) and column in rounds[index].get(reward_op.target_user_id, {}):
+            index += 1
+        if index == len(rounds):
+            rounds.append({})
+        rounds[index].setdefault(reward_op.target_user_id, {})[column] = \
+            OP_MAP[reward_op.operation](0, reward_op.amount)
+        placement.append((index, column))
+
+    balances = []
+    for deltas in rounds:
+        rewards = await reward_repo.add_to_balances(deltas, kind="update", created_by_id=current_user.id)
+        balances.append({user_id: {column: getattr(rewards[user_id], column) for column in user_deltas}
+                         for user_id, user_deltas in deltas.items()})
+    await reward_repo.session.commit()
+
+    return [
+        UpdateResult(value=balances[index][reward_op.target_user_id][column])
+        for reward_op, (index, column) in zip(reward_ops, placement)
+    ]
 
 
 def main():
@@ -284,5 +574,62 @@ def main():
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
 
+async def end_week_for(family_id: Optional[UUID], concurrency: int) -> BatchRolloverResult:
+    assert db_state.async_session_maker is not None
+    async with db_state.async_session_maker() as session:
+        if family_id is None:
+            user_ids = await ChoreRepository(session).get_user_ids()
+        else:
+            user_ids = await FamilyRepository(session).get_member_ids(family_id)
+    return await archive_and_reset_many(user_ids, db_state.async_session_maker, concurrency=concurrency)
+
+
+def end_week_main():
+    """
+    Ends the week for a whole family or for everyone, from the command line
+    """
+    import argparse
+    import asyncio
+    from .settings import DailyDriveSettings
+
+    parser = argparse.ArgumentParser(description="End the chore week for many users at once")
+    scope = parser.add_mutually_exclusive_group(required=True)
+    scope.add_argument("--family-id", type=UUID, help="End the week for every member of this family")
+    scope.add_argument("--all", action="store_true", help="End the week for every user with chores")
+    parser.add_argument("--concurrency", type=int, default=None)
+    args = parser.parse_args()
+
+    settings = DailyDriveSettings()
+    db_state.init(settings.database_url, settings)
+    concurrency = args.concurrency or settings.rollover_concurrency
+    result = asyncio.run(end_week_for(None if args.all else args.family_id, concurrency))
+    print(result.model_dump_json(indent=2))
+
+
+def rebuild_rewards_main():
+    """
+    Replays the reward ledger and checks, or with --repair fixes, the balances in the rewards table
+    """
+    import argparse
+    import asyncio
+    import sys
+    from .reward_ledger import LEDGER_CHUNK_SIZE, rebuild_reward_balances
+    from .settings import DailyDriveSettings
+
+    parser = argparse.ArgumentParser(description="Verify the reward balances against the reward ledger")
+    parser.add_argument("--repair", action="store_true",
+                        help="Overwrite drifted balances with the replayed ones and open missing ledgers")
+    parser.add_argument("--chunk-size", type=int, default=LEDGER_CHUNK_SIZE,
+                        help="Ledger rows fetched and users checked at a time")
+    args = parser.parse_args()
+
+    settings = DailyDriveSettings()
+    db_state.init(settings.database_url, settings)
+    assert db_state.async_session_maker is not None
+    result = asyncio.run(rebuild_reward_balances(db_state.async_session_maker, args.repair, args.chunk_size))
+    print(result.model_dump_json(indent=2))
+    sys.exit(0 if result.ok else 1)
+
+
 if __name__ == "__main__":
     main()
@@ -4,7 +4,7 @@ from typing import Annotated, List, Optional, Tuple
 
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID
 from pydantic import BaseModel, ConfigDict, Field
-from sqlalchemy import JSON, Column, DateTime, ForeignKey, String, Table
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, String, Table, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import DeclarativeBase, relationship
 from sqlalchemy.types import Date, Float, Integer
@@ -43,6 +43,11 @@ class Chore(Base):
 
     user = relationship('User', back_populates='chores')
 
+    __table_args__ = (
+        Index('ix_chores_user_id_week_start_date', 'user_id', 'week_start_date'),
+        Index('ix_chores_week_start_date', 'week_start_date'),
+    )
+
 
 class ChoreHistory(Base):
     __tablename__ = 'chore_history'
@@ -54,12 +59,20 @@ class ChoreHistory(Base):
     expired_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
     reward_func = Column(String, nullable=True)
 
+    __table_args__ = (
+        UniqueConstraint('chore_id', 'week_start_date', name='uq_chore_history_chore_week'),
+        # Serves the per week lookups of a rollover and the keyset pages of the history API
+        Index('ix_chore_history_user_id_week_start_date_id', 'user_id', 'week_start_date', 'id'),
+    )
+
 
 user_family_association = Table(
     'user_family_association',
     Base.metadata,
-    Column('user_id', UUID(as_uuid=True), ForeignKey('user.id')),
-    Column('family_id', UUID(as_uuid=True), ForeignKey('user_family.id'))
+    Column('user_id', ForeignKey('user.id')),
+    Column('family_id', UUID(as_uuid=True), ForeignKey('user_family.id')),
+    Index('ix_user_family_association_user_id', 'user_id'),
+    Index('ix_user_family_association_family_id', 'family_id'),
 )
 
 
@@ -85,17 +98,74 @@ class UserFamily(Base):
 
 
 class Reward(Base):
+    """
+    Current balances of a user, materialized from their RewardTransaction ledger.
+
+    version counts the transactions applied to the row and is the version of the latest one.
+    """
     __tablename__ = 'rewards'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     user_id = Column(UUID(as_uuid=True), ForeignKey('user.id'), nullable=False)
     star_points = Column(Integer, nullable=False, default=0)
     tv_time_points = Column(Float, nullable=False, default=0)
     game_time_points = Column(Float, nullable=False, default=0)
+    version = Column(Integer, nullable=False, default=0, server_default='0')
     created_at = Column(DateTime(timezone=True), default=utcnow)
     updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
 
     user = relationship('User', back_populates='rewards')
 
+    __table_args__ = (UniqueConstraint('user_id', name='uq_rewards_user_id'),)
+
+
+class RewardTransaction(Base):
+    """
+    Append-only ledger of the changes to the rewards of a user.
+
+    The amounts are the requested changes, the balances those of the rewards row afterwards,
+    once clamped. version is the rewards version the change produced, so replaying a user's
+    transactions by version reproduces their balances. An "opening" transaction sets the
+    balances instead of adding to them.
+    """
+    __tablename__ = 'reward_transactions'
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('user.id'), nullable=False)
+    version = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)
+    star_points = Column(Integer, nullable=False, default=0)
+    tv_time_points = Column(Float, nullable=False, default=0)
+    game_time_points = Column(Float, nullable=False, default=0)
+    star_points_balance = Column(Integer, nullable=False)
+    tv_time_points_balance = Column(Float, nullable=False)
+    game_time_points_balance = Column(Float, nullable=False)
+    created_by_id = Column(UUID(as_uuid=True), ForeignKey('user.id'), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+
+    __table_args__ = (
+        # Also serves the ordered replay of the ledger
+        UniqueConstraint('user_id', 'version', name='uq_reward_transactions_user_id_version'),
+    )
+
+
+class UserWeekScores(Base):
+    """
+    Running week scores of a user, kept up to date as single chores change.
+
+    chore_ids and reward_funcs hold the chore and reward rule of every row of table, in row order.
+    """
+    __tablename__ = 'user_week_scores'
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('user.id'), nullable=False)
+    week_start_date = Column(Date, nullable=False)
+    chore_ids = Column(JSON, nullable=False)
+    table = Column(JSON, nullable=False)
+    reward_funcs = Column(JSON, nullable=True)
+    scores = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (UniqueConstraint('user_id', 'week_start_date', name='uq_user_week_scores_user_week'),)
+
 
 class ChoreTable(BaseModel):
     table: List[Annotated[List[str], Field(min_length=7, max_length=7)]]
@@ -121,11 +191,31 @@ class UserRewardScores(BaseModel):
     reward: CurrentReward
 
 
+class WeekScoresSummary(BaseModel):
+    total_points: int = 0
+    total_minutes: int = 0
+
+
+class UserRewardSummary(BaseModel):
+    scores: WeekScoresSummary
+    reward: CurrentReward
+
+
+class WeekScoresDrift(BaseModel):
+    user_id: uuid.UUID
+    week_start_date: date
+    in_sync: bool
+    stored: Optional[WeekScores] = None
+    expected: WeekScores
+    repaired: bool = False
+
+
 class UiChore(BaseModel):
     id: uuid.UUID
     name: str
     statuses: dict[str, str]
     user_id: Optional[uuid.UUID] = None
+    reward_func: Optional[str] = None
 
     model_config = ConfigDict(
         from_attributes=True,
@@ -134,6 +224,26 @@ class UiChore(BaseModel):
     )
 
 
+class UiChoreHistory(BaseModel):
+    id: uuid.UUID
+    chore_id: uuid.UUID
+    week_start_date: date
+    statuses: dict[str, str]
+    expired_at: Optional[datetime] = None
+    reward_func: Optional[str] = None
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        arbitrary_types_allowed=True,
+        json_encoders={UUID: str}
+    )
+
+
+class ChoreHistoryPage(BaseModel):
+    items: List[UiChoreHistory]
+    next_cursor: Optional[str] = None
+
+
 class UiUser(BaseModel):
     id: uuid.UUID
     email: str
@@ -0,0 +1,56 @@
+"""
+Password hashing off the event loop.
+
+Hashing and verifying a password takes tens of milliseconds of CPU by design. The argon2
+and bcrypt bindings release the GIL while they work, so running them on a small thread
+pool keeps the event loop serving other requests during a burst of logins.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from fastapi_users.password import PasswordHelper
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+from pwdlib.hashers.bcrypt import BcryptHasher
+
+
+class OffloadedPasswordHelper(PasswordHelper):
+    """
+    PasswordHelper with awaitable variants that run on a bounded thread pool.
+
+    New hashes use argon2 with the configured cost, existing bcrypt hashes still verify.
+    """
+
+    def __init__(self, workers: int = 4, time_cost: int = 3, memory_cost_kib: int = 65536):
+        super().__init__()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.configure(workers, time_cost, memory_cost_kib)
+
+    def configure(self, workers: int, time_cost: int, memory_cost_kib: int):
+        self.password_hash = PasswordHash((
+            Argon2Hasher(time_cost=time_cost, memory_cost=memory_cost_kib),
+            BcryptHasher(),
+        ))
+        self.shutdown()
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run(self.hash, password)
+
+    async def verify_and_update_async(self, plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        return await self._run(self.verify_and_update, plain_password, hashed_password)
+
+
+password_helper = OffloadedPasswordHelper()
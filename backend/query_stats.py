@@ -0,0 +1,141 @@
+"""
+Counts the SQL statements and database time spent on behalf of a request.
+
+track_queries hooks an engine once, statements are then attributed to whatever QueryStats
+is active in the current context: the one a QueryStatsMiddleware opened for the request,
+or one opened by count_queries around a block of code.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import logging
+import time
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# A statement run more often than this within one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+_current_stats: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+
+@dataclass
+class QueryStats:
+    statements: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated_statements(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> dict[str, int]:
+        """
+        Returns the statements that ran more than threshold times, with how often they ran
+        """
+        return {statement: count for statement, count in Counter(self.statements).items() if count > threshold}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    start_times = conn.info.get("query_start_times")
+    if start_times:
+        stats.seconds += time.perf_counter() - start_times.pop()
+    stats.statements.append(statement)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute, drop the start time it left behind
+    conn = exception_context.connection
+    if conn is not None and exception_context.execution_context is not None and _current_stats.get() is not None:
+        start_times = conn.info.get("query_start_times")
+        if start_times:
+            start_times.pop()
+
+
+def track_queries(engine: AsyncEngine):
+    """
+    Attributes every statement run on the engine to the active QueryStats, if any
+    """
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@contextmanager
+def assert_max_queries(max_statements: int) -> Iterator[QueryStats]:
+    """
+    Fails with the offending statements if the block runs more than max_statements statements,
+    for locking in the query budget of a code path in tests
+    """
+    with count_queries() as stats:
+        yield stats
+    if stats.count > max_statements:
+        listing = "\n".join(f"  {' '.join(statement.split())}" for statement in stats.statements)
+        raise AssertionError(f"Expected at most {max_statements} statements, got {stats.count}:\n{listing}")
+
+
+def assert_query_budget(response, max_statements: int):
+    """
+    Fails if a response served in debug mode reports more than max_statements statements
+    """
+    if "X-DB-Queries" not in response.headers:
+        raise AssertionError("Response has no X-DB-Queries header, is the app running with debug enabled?")
+    statements = int(response.headers["X-DB-Queries"])
+    if statements > max_statements:
+        raise AssertionError(f"{response.request.method} {response.request.url.path} ran {statements} statements, "
+                             f"the budget is {max_statements}")
+
+
+class QueryStatsMiddleware:
+    """
+    Counts the statements of every request and reports them in the X-DB-Queries and
+    X-DB-Time (milliseconds) response headers, when the app runs with debug enabled.
+
+    Only statements run before the response starts are counted.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        state = scope.get("state", {}).get("daily_drive_state")
+        if scope["type"] != "http" or state is None or not state.settings.debug:
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries() as stats:
+            async def send_with_stats(message: Message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-queries", str(stats.count).encode()))
+                    headers.append((b"x-db-time", f"{stats.seconds * 1000:.2f}".encode()))
+                    message = {**message, "headers": headers}
+                    for statement, count in stats.repeated_statements().items():
+                        logger.warning("Possible N+1 in %s %s, ran %d times: %s",
+                                       scope["method"], scope["path"], count, " ".join(statement.split()))
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
@@ -2,6 +2,7 @@ from abc import abstractmethod
 from typing import Dict, Generic, Iterable, Optional, TypeVar
 from uuid import UUID
 
+from sqlalchemy import delete, insert, inspect, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
@@ -49,6 +50,18 @@ class BaseRepository(Generic[T]):
         return entity
 
     async def update(self, entity_id: UUID, updated_data: Dict) -> Optional[T]:
+        """
+        Updates an entity with a single UPDATE ... RETURNING where the dialect supports it
+        """
+        if self._dialect_supports("update_returning"):
+            result = await self.session.scalars(
+                update(self.model).where(self.model.id == entity_id).values(**updated_data).returning(self.model),
+                execution_options={"populate_existing": True}
+            )
+            entity = result.first()
+            await self.session.commit()
+            return entity
+
         result = await self.session.execute(select(self.model).filter(self.model.id == entity_id))
         entity = result.scalars().first()
         if entity:
@@ -65,6 +78,20 @@ class BaseRepository(Generic[T]):
         return entity
 
     async def delete(self, entity_id: UUID) -> Optional[T]:
+        """
+        Deletes an entity with a single DELETE ... RETURNING where the dialect supports it.
+
+        Models with relationships the ORM has to cascade to are loaded and deleted through
+        the session instead.
+        """
+        if self._dialect_supports("delete_returning") and not self._has_orm_cascades():
+            result = await self.session.scalars(
+                delete(self.model).where(self.model.id == entity_id).returning(self.model)
+            )
+            entity = result.first()
+            await self.session.commit()
+            return entity
+
         result = await self.session.execute(select(self.model).filter(self.model.id == entity_id))
         entity = result.scalars().first()
         if entity:
@@ -72,3 +99,94 @@ class BaseRepository(Generic[T]):
             await self.session.commit()
             return entity
         return None
+
+    def _has_orm_cascades(self) -> bool:
+        return any(relation.secondary is not None or relation.cascade.delete
+                   for relation in inspect(self.model).relationships)
+
+    def _dialect_supports(self, feature: str) -> bool:
+        """
+        Checks a dialect capability such as insert_executemany_returning or delete_returning
+        """
+        return bool(getattr(self.session.get_bind().dialect, feature, False))
+
+    @staticmethod
+    def _in_order(entities: Iterable[T], entity_ids: list[UUID]) -> list[T]:
+        by_id = {entity.id: entity for entity in entities}
+        return [by_id[entity_id] for entity_id in entity_ids if entity_id in by_id]
+
+    async def add_many(self, entities_data: Iterable[Dict]) -> list[T]:
+        """
+        Inserts many entities in one statement and one transaction
+        """
+        rows = list(entities_data)
+        if not rows:
+            return []
+
+        if self._dialect_supports("insert_executemany_returning"):
+            # Returned in the order of rows, insertmanyvalues batches may come back reordered otherwise
+            result = await self.session.scalars(insert(self.model).returning(self.model, sort_by_parameter_order=True),
+                                                rows)
+            entities = list(result.all())
+        else:
+            entities = [self.model(**row) for row in rows]
+            self.session.add_all(entities)
+            await self.session.flush()
+        await self.session.commit()
+        return entities
+
+    async def update_many(self, updates: Iterable[Dict]) -> list[T]:
+        """
+        Updates many entities in one transaction, every dict holding the "id" of the entity
+        to update next to its new values.
+
+        When every entity gets the same values this is a single UPDATE ... WHERE id IN,
+        otherwise a single executemany UPDATE by primary key.
+        """
+        rows = list(updates)
+        if not rows:
+            return []
+
+        entity_ids = [row["id"] for row in rows]
+        values = [{key: value for key, value in row.items() if key != "id"} for row in rows]
+
+        if all(value == values[0] for value in values):
+            stmt = update(self.model).where(self.model.id.in_(entity_ids)).values(**values[0])
+            if self._dialect_supports("update_returning"):
+                result = await self.session.scalars(
+                    stmt.returning(self.model),
+                    execution_options={"populate_existing": True}
+                )
+                entities = self._in_order(result.all(), entity_ids)
+                await self.session.commit()
+                return entities
+            await self.session.execute(stmt)
+        else:
+            await self.session.execute(update(self.model), rows)
+
+        result = await self.session.scalars(
+            select(self.model).filter(self.model.id.in_(entity_ids)),
+            execution_options={"populate_existing": True}
+        )
+        entities = self._in_order(result.all(), entity_ids)
+        await self.session.commit()
+        return entities
+
+    async def delete_many(self, entity_ids: Iterable[UUID]) -> list[T]:
+        """
+        Deletes many entities in one statement and one transaction, returning the deleted entities
+        """
+        entity_ids = list(entity_ids)
+        if not entity_ids:
+            return []
+
+        stmt = delete(self.model).where(self.model.id.in_(entity_ids))
+        if self._dialect_supports("delete_returning"):
+            result = await self.session.scalars(stmt.returning(self.model))
+            entities = list(result.all())
+        else:
+            result = await self.session.scalars(select(self.model).filter(self.model.id.in_(entity_ids)))
+            entities = list(result.all())
+            await self.session.execute(stmt)
+        await self.session.commit()
+        return entities
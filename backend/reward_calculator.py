@@ -1,14 +1,29 @@
-from typing import Iterable
-from pydantic import Json
+import asyncio
+from datetime import date, timedelta
+import logging
+from typing import TYPE_CHECKING, Callable, Iterable, Optional, Sequence
+import uuid
+
+from pydantic import BaseModel, Field, Json
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
-from .models import ChoreTable, WeekScores, Chore, ChoreHistory, get_current_week_start, utcnow, Reward, UiChore
+from .models import (ChoreTable, WeekScores, WeekScoresDrift, Chore, get_current_week_start, utcnow, UiChore,
+                     UserWeekScores)
 from .chore_repository import ChoreRepository, ChoreHistoryRepository
 from .reward_repository import RewardRepository
+from .score_repository import WeekScoresRepository
 from .pydantic_utils import GenericResult, Ok, Err
+from .reward_rules import reward_rules
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
 
 
 WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+RESET_STATUSES = {day: "_" for day in WEEKDAYS}
 
 
 FULL_COLUMN_MIN_HEIGHT = 4
@@ -18,25 +33,48 @@ SINGLE_TRIPLET_PENALTY_MINUTES = 20
 PERFECT_DAY_AWARD_MINUTES = 30
 
 
-def calculate_reward_times(scores: WeekScores) -> WeekScores:
-    if scores.horizontal_X_triplets:
-        # always award extra time for the first first triplet
-        scores.total_minutes += HORIZONTAL_TRIPLET_AWARD_MINUTES
-    scores.total_minutes += len(scores.horizontal_X_triplets) * HORIZONTAL_TRIPLET_AWARD_MINUTES
+def reward_minutes(horizontal_x: int, horizontal_o: int, vertical_x: int, full_x_columns: int) -> int:
+    """
+    Returns the minutes earned for the given numbers of triplets and full columns
+    """
+    minutes = 0
+    # always award extra time for the first first triplet
+    minutes += (horizontal_x > 0) * HORIZONTAL_TRIPLET_AWARD_MINUTES
+    minutes += horizontal_x * HORIZONTAL_TRIPLET_AWARD_MINUTES
 
-    scores.total_minutes += len(scores.vertical_X_triplets) * VERTICAL_TRIPLET_AWARD_MINUTES
+    minutes += vertical_x * VERTICAL_TRIPLET_AWARD_MINUTES
 
-    if scores.horizontal_O_triplets:
-        # always penalize extra time for the first triplet
-        scores.total_minutes -= SINGLE_TRIPLET_PENALTY_MINUTES
-    scores.total_minutes -= len(scores.horizontal_O_triplets) * SINGLE_TRIPLET_PENALTY_MINUTES
+    # always penalize extra time for the first triplet
+    minutes -= (horizontal_o > 0) * SINGLE_TRIPLET_PENALTY_MINUTES
+    minutes -= horizontal_o * SINGLE_TRIPLET_PENALTY_MINUTES
 
-    if scores.full_X_columns:
-        scores.total_minutes += len(scores.full_X_columns) * PERFECT_DAY_AWARD_MINUTES
+    minutes += full_x_columns * PERFECT_DAY_AWARD_MINUTES
+    return minutes
 
+
+def calculate_reward_times(scores: WeekScores) -> WeekScores:
+    scores.total_minutes += reward_minutes(len(scores.horizontal_X_triplets),
+                                           len(scores.horizontal_O_triplets),
+                                           len(scores.vertical_X_triplets),
+                                           len(scores.full_X_columns))
     return scores
 
 
+class ScoreTally:
+    """
+    Totals of a scored table, without the locations of the triplets
+    """
+    __slots__ = ("total_points", "horizontal_X", "horizontal_O", "vertical_X", "full_X_columns", "total_minutes")
+
+    def __init__(self):
+        self.total_points = 0
+        self.horizontal_X = 0
+        self.horizontal_O = 0
+        self.vertical_X = 0
+        self.full_X_columns = 0
+        self.total_minutes = 0
+
+
 def find_regularities_with_locations(chore_table: ChoreTable) -> WeekScores:
     table = chore_table.table
     scores = WeekScores()
@@ -83,9 +121,313 @@ def find_regularities_with_locations(chore_table: ChoreTable) -> WeekScores:
     return calculate_reward_times(scores)
 
 
+def _row_masks(row: list[str]) -> tuple[int, int]:
+    """
+    Packs a row of statuses into X and O bitmasks, bit c standing for column c
+    """
+    x_mask = 0
+    o_mask = 0
+    for c, status in enumerate(row):
+        if status == 'X':
+            x_mask |= 1 << c
+        elif status == 'O':
+            o_mask |= 1 << c
+    return x_mask, o_mask
+
+
+def _triplet_starts(mask: int) -> int:
+    """
+    Returns a mask with bit c set whenever bits c, c+1 and c+2 are all set in the given mask
+    """
+    return mask & (mask >> 1) & (mask >> 2)
+
+
+def _greedy_horizontal(starts: int) -> list[int]:
+    """
+    Picks non-overlapping triplet start columns from left to right, same as the list based search
+    """
+    picked = []
+    next_free = 0
+    while starts:
+        c = (starts & -starts).bit_length() - 1
+        starts &= starts - 1
+        if c >= next_free:
+            picked.append(c)
+            next_free = c + 3
+    return picked
+
+
+def find_regularities_bitboard(chore_table: ChoreTable) -> WeekScores:
+    """
+    Bitmask based equivalent of find_regularities_with_locations.
+
+    Every row is packed into an X and an O mask, so triplets, vertical runs and
+    full columns are found with shifts and ANDs instead of list slicing.
+    """
+    table = chore_table.table
+    scores = WeekScores()
+
+    rows = len(table)
+    if rows == 0:
+        return scores
+
+    cols = len(table[0])
+    if cols == 0:
+        return scores
+
+    masks = [_row_masks(row) for row in table]
+
+    # Horizontal triplet search
+    for r, (x_mask, o_mask) in enumerate(masks):
+        scores.total_points += x_mask.bit_count()
+
+        for c in _greedy_horizontal(_triplet_starts(x_mask)):
+            scores.horizontal_X_triplets.append([(r, c), (r, c+1), (r, c+2)])
+        for c in _greedy_horizontal(_triplet_starts(o_mask)):
+            scores.horizontal_O_triplets.append([(r, c), (r, c+1), (r, c+2)])
+
+    # Vertical triplet search, a run starting at row r may only be taken in the
+    # columns where row r is not already covered by a run started above it
+    vertical_starts = []
+    covered_this_row = 0
+    covered_next_row = 0
+    for r in range(rows - 2):
+        taken = masks[r][0] & masks[r+1][0] & masks[r+2][0] & ~covered_this_row
+        if taken:
+            vertical_starts.append((r, taken))
+        covered_this_row = covered_next_row | taken
+        covered_next_row = taken
+
+    vertical = []
+    for r, taken in vertical_starts:
+        while taken:
+            c = (taken & -taken).bit_length() - 1
+            taken &= taken - 1
+            vertical.append((c, r))
+    vertical.sort()
+    scores.vertical_X_triplets = [[(r, c), (r+1, c), (r+2, c)] for c, r in vertical]
+
+    # Full column search
+    if rows >= FULL_COLUMN_MIN_HEIGHT:
+        full_mask = (1 << cols) - 1
+        for x_mask, _ in masks:
+            full_mask &= x_mask
+        scores.full_X_columns = [c for c in range(cols) if full_mask >> c & 1]
+
+    return calculate_reward_times(scores)
+
+
+def summarize_table(chore_table: ChoreTable) -> ScoreTally:
+    """
+    Bitmask based scoring that only counts triplets and full columns, for callers that
+    need the totals and not where the triplets are
+    """
+    table = chore_table.table
+    tally = ScoreTally()
+    if not table or not table[0]:
+        return tally
+
+    masks = [_row_masks(row) for row in table]
+    for x_mask, o_mask in masks:
+        tally.total_points += x_mask.bit_count()
+        tally.horizontal_X += len(_greedy_horizontal(_triplet_starts(x_mask)))
+        tally.horizontal_O += len(_greedy_horizontal(_triplet_starts(o_mask)))
+
+    covered_this_row = 0
+    covered_next_row = 0
+    for r in range(len(table) - 2):
+        taken = masks[r][0] & masks[r+1][0] & masks[r+2][0] & ~covered_this_row
+        tally.vertical_X += taken.bit_count()
+        covered_this_row = covered_next_row | taken
+        covered_next_row = taken
+
+    if len(table) >= FULL_COLUMN_MIN_HEIGHT:
+        full_mask = (1 << len(table[0])) - 1
+        for x_mask, _ in masks:
+            full_mask &= x_mask
+        tally.full_X_columns = full_mask.bit_count()
+
+    tally.total_minutes = reward_minutes(tally.horizontal_X, tally.horizontal_O, tally.vertical_X,
+                                         tally.full_X_columns)
+    return tally
+
+
+def _greedy_runs(windows: "np.ndarray") -> "np.ndarray":
+    """
+    Greedily takes non-overlapping triplets along the last axis of a boolean array of
+    triplet windows, window i overlapping with the windows taken at i-1 and i-2
+    """
+    import numpy as np
+
+    taken = np.zeros_like(windows)
+    for i in range(windows.shape[-1]):
+        blocked = np.zeros_like(windows[..., i])
+        if i >= 1:
+            blocked |= taken[..., i-1]
+        if i >= 2:
+            blocked |= taken[..., i-2]
+        taken[..., i] = windows[..., i] & ~blocked
+    return taken
+
+
+def score_many(tables: Sequence[ChoreTable]) -> list[WeekScores]:
+    """
+    Scores many chore tables at once.
+
+    The tables are stacked into a single (tables, rows, weekdays) array padded with
+    empty rows up to the largest table, and every search is done as a handful of
+    vectorized passes over the whole batch. Produces the same WeekScores as
+    find_regularities_with_locations for every table.
+    """
+    if not tables:
+        return []
+
+    # Imported here, numpy alone takes longer to import than the rest of the app
+    import numpy as np
+
+    cols = len(WEEKDAYS)
+    row_counts = np.array([len(chore_table.table) for chore_table in tables])
+    max_rows = int(row_counts.max())
+
+    statuses = np.full((len(tables), max_rows, cols), '_', dtype='<U1')
+    for n, chore_table in enumerate(tables):
+        if chore_table.table:
+            statuses[n, :len(chore_table.table)] = chore_table.table
+    is_x = statuses == 'X'
+    is_o = statuses == 'O'
+    is_row = np.arange(max_rows)[None, :] < row_counts[:, None]
+
+    total_points = is_x.sum(axis=(1, 2))
+
+    # Horizontal triplets, windows indexed by their starting column
+    h_x = _greedy_runs(is_x[..., :-2] & is_x[..., 1:-1] & is_x[..., 2:])
+    h_o = _greedy_runs(is_o[..., :-2] & is_o[..., 1:-1] & is_o[..., 2:])
+
+    # Vertical triplets, swapped so the greedy pass runs down the rows of each column
+    columns = is_x.swapaxes(1, 2)
+    v_x = _greedy_runs(columns[..., :-2] & columns[..., 1:-1] & columns[..., 2:])
+
+    # Full columns, padding rows count as X so only the real rows decide
+    full = (is_x | ~is_row[..., None]).all(axis=1) & (row_counts >= FULL_COLUMN_MIN_HEIGHT)[:, None]
+
+    total_minutes = reward_minutes(h_x.sum(axis=(1, 2)), h_o.sum(axis=(1, 2)), v_x.sum(axis=(1, 2)), full.sum(axis=1))
+
+    all_scores = [WeekScores() for _ in tables]
+    for n, r, c in zip(*np.nonzero(h_x)):
+        all_scores[n].horizontal_X_triplets.append([(int(r), int(c)+i) for i in range(3)])
+    for n, r, c in zip(*np.nonzero(h_o)):
+        all_scores[n].horizontal_O_triplets.append([(int(r), int(c)+i) for i in range(3)])
+    for n, c, r in zip(*np.nonzero(v_x)):
+        all_scores[n].vertical_X_triplets.append([(int(r)+i, int(c)) for i in range(3)])
+    for n, c in zip(*np.nonzero(full)):
+        all_scores[n].full_X_columns.append(int(c))
+
+    for n, scores in enumerate(all_scores):
+        if row_counts[n] == 0:
+            continue
+        scores.total_points = int(total_points[n])
+        scores.total_minutes = int(total_minutes[n])
+
+    return all_scores
+
+
+def _vertical_triplets_in_column(table: list[list[str]], c: int) -> list[list[tuple[int, int]]]:
+    triplets = []
+    r = 0
+    while r < len(table) - 2:
+        if table[r][c] == table[r+1][c] == table[r+2][c] == 'X':
+            triplets.append([(r, c), (r+1, c), (r+2, c)])
+            r += 3
+        else:
+            r += 1
+    return triplets
+
+
+def rescore_row(table: list[list[str]], scores: WeekScores, r: int, new_row: list[str]) -> WeekScores:
+    """
+    Updates the scores of a table whose row r changes to new_row.
+
+    Only the horizontal triplets of row r and the vertical triplets and full column
+    state of the columns that actually changed are recomputed. The table is updated
+    in place, the returned scores are a new object.
+    """
+    old_row = table[r]
+    table[r] = list(new_row)
+    changed_columns = {c for c, (old, new) in enumerate(zip(old_row, new_row)) if old != new}
+
+    updated = scores.model_copy(deep=True)
+    updated.total_points += new_row.count('X') - old_row.count('X')
+
+    x_mask, o_mask = _row_masks(new_row)
+    updated.horizontal_X_triplets = sorted(
+        [triplet for triplet in updated.horizontal_X_triplets if triplet[0][0] != r]
+        + [[(r, c), (r, c+1), (r, c+2)] for c in _greedy_horizontal(_triplet_starts(x_mask))]
+    )
+    updated.horizontal_O_triplets = sorted(
+        [triplet for triplet in updated.horizontal_O_triplets if triplet[0][0] != r]
+        + [[(r, c), (r, c+1), (r, c+2)] for c in _greedy_horizontal(_triplet_starts(o_mask))]
+    )
+
+    if changed_columns:
+        vertical = [triplet for triplet in updated.vertical_X_triplets if triplet[0][1] not in changed_columns]
+        for c in changed_columns:
+            vertical.extend(_vertical_triplets_in_column(table, c))
+        updated.vertical_X_triplets = sorted(vertical, key=lambda triplet: (triplet[0][1], triplet[0][0]))
+
+        full_columns = set(updated.full_X_columns) - changed_columns
+        if len(table) >= FULL_COLUMN_MIN_HEIGHT:
+            full_columns |= {c for c in changed_columns if all(row[c] == 'X' for row in table)}
+        updated.full_X_columns = sorted(full_columns)
+
+    updated.total_minutes = 0
+    return calculate_reward_times(updated)
+
+
+def apply_reward_rules(scores: WeekScores,
+                       table: list[list[str]],
+                       reward_funcs: Optional[Sequence[Optional[str]]]) -> WeekScores:
+    """
+    Adds the minutes earned by the per-chore reward rules, reward_funcs holding the
+    rule of every row of the table. Returns a new WeekScores when any rule applies.
+    """
+    rule_minutes = reward_rule_minutes(table, reward_funcs)
+    if not rule_minutes:
+        return scores
+    return scores.model_copy(update={"total_minutes": scores.total_minutes + rule_minutes})
+
+
+def reward_rule_minutes(table: list[list[str]], reward_funcs: Optional[Sequence[Optional[str]]]) -> int:
+    if not reward_funcs or not any(reward_funcs):
+        return 0
+    return reward_rules.evaluate(table, reward_funcs)
+
+
+SCORING_ENGINES: dict[str, Callable[[ChoreTable], WeekScores]] = {
+    "reference": find_regularities_with_locations,
+    "bitboard": find_regularities_bitboard,
+}
+
+
+def get_scoring_engine(name: str) -> Callable[[ChoreTable], WeekScores]:
+    """
+    Returns the scoring function registered under the given name
+    """
+    try:
+        return SCORING_ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown scoring engine '{name}', expected one of {sorted(SCORING_ENGINES)}")
+
+
 ChoresResult = GenericResult[list[UiChore], Json]
 
 
+def chore_row(chore: Chore | UiChore) -> list[str]:
+    """
+    Returns the statuses of a chore as a table row ordered by weekday
+    """
+    return [chore.statuses[day] for day in WEEKDAYS]
+
+
 def make_chore_result(chores: Iterable[Chore]) -> ChoresResult:
     """
     Helper function to create a RailResult
@@ -105,8 +447,14 @@ async def archive_and_reset_user_chores(
     user_id: UUID,
     chore_repo: ChoreRepository,
     chore_history_repo: ChoreHistoryRepository,
-    reward_repo: RewardRepository
+    reward_repo: RewardRepository,
+    week_scores_repo: Optional[WeekScoresRepository] = None,
 ) -> ChoresResult:
+    """
+    Archives the user's chores, resets them for the new week and adds the week's rewards.
+
+    All repositories must share one session, the writes are committed as one transaction.
+    """
     # Step 1: Fetch current chores for the specific user
     user_chores: Iterable[Chore] = await chore_repo.get_by_user_id(user_id)
 
@@ -120,51 +468,279 @@ async def archive_and_reset_user_chores(
     if existing_history:
         return make_chores_error("Chores for this week have already been archived")
 
-    chore_statuses_json: list = [chore.statuses for chore in user_chores]
-    chores_by_day = []
-    for chore_statuses in chore_statuses_json:
-        chores_as_list = [chore_statuses[day] for day in WEEKDAYS]
-        chores_by_day.append(chores_as_list)
-
-    chore_table = ChoreTable(table=chores_by_day)
-
-    # Step 2: Create and add chore history entries
-    for chore in user_chores:
-        chore_history = ChoreHistory(
-            chore_id=chore.id,
-            user_id=chore.user_id,
-            week_start_date=chore.week_start_date,
-            statuses=chore.statuses,
-            expired_at=utcnow(),
-            reward_func=chore.reward_func
-        )
-        await chore_history_repo.add_entity(chore_history)
-
-    # Step 3: Reset statuses of existing chores
-    reset_statuses = {day: "_" for day in WEEKDAYS}
-
-    for chore in user_chores:
-        await chore_repo.update(chore.id, {
-            "statuses": reset_statuses,
-            "week_start_date": get_current_week_start()
-        })
-
-    # Step 4: Calculate rewards for the user
-    reward = await reward_repo.get_single_by_user_id(user_id)
+    chore_table = ChoreTable(table=[chore_row(chore) for chore in user_chores])
+
     scores = find_regularities_with_locations(chore_table)
+    scores = apply_reward_rules(scores, chore_table.table, [chore.reward_func for chore in user_chores])
 
-    if reward is None:
-        reward = Reward(
-            user_id=user_id,
-            star_points=scores.total_points,
-            tv_time_points=scores.total_minutes,
-            game_time_points=scores.total_minutes,
-        )
-        await reward_repo.add_entity(reward)
-    else:
-        reward.star_points += scores.total_points
-        reward.tv_time_points = max(0, reward.tv_time_points + scores.total_minutes)
-        reward.game_time_points = max(0, reward.game_time_points + scores.total_minutes)
-        await reward_repo.update_entity(reward)
+    try:
+        await archive_user_week(user_id, user_chores, scores, chore_repo, chore_history_repo, reward_repo,
+                                week_scores_repo)
+    except WeekAlreadyArchived:
+        return make_chores_error("Chores for this week have already been archived")
 
     return make_chore_result(user_chores)
+
+
+class WeekAlreadyArchived(Exception):
+    pass
+
+
+async def archive_user_week(
+    user_id: UUID,
+    user_chores: Iterable[Chore],
+    scores: WeekScores,
+    chore_repo: ChoreRepository,
+    chore_history_repo: ChoreHistoryRepository,
+    reward_repo: RewardRepository,
+    week_scores_repo: Optional[WeekScoresRepository] = None,
+) -> None:
+    """
+    Archives already scored chores, resets them and adds the scores to the user's rewards.
+
+    Everything runs in a single transaction, so a failure leaves the week untouched. Raises
+    WeekAlreadyArchived, after rolling back, if any of the chores was archived for its week
+    by someone else in the meantime.
+    """
+    session = chore_repo.session
+    user_chores = list(user_chores)
+    try:
+        # Archive all chores in one bulk insert, skipping the ones that already are
+        archived = await chore_history_repo.archive_chores(user_chores, expired_at=utcnow())
+        if archived < len(user_chores):
+            raise WeekAlreadyArchived(user_id)
+
+        # Reset the archived chores to the week after the archived one, in one update per week,
+        # so a week is never archived twice even when it is ended before it is over
+        current_week_start = get_current_week_start()
+        chore_ids_by_week: dict[date, list[UUID]] = {}
+        for chore in user_chores:
+            next_week_start = max(current_week_start, chore.week_start_date + timedelta(days=7))
+            chore_ids_by_week.setdefault(next_week_start, []).append(chore.id)
+        for week_start_date, chore_ids in chore_ids_by_week.items():
+            await chore_repo.reset_user_chores(user_id, RESET_STATUSES, week_start_date, chore_ids=chore_ids)
+
+        # Add the week's rewards for the user
+        await reward_repo.add_to_balances({user_id: {
+            "star_points": scores.total_points,
+            "tv_time_points": scores.total_minutes,
+            "game_time_points": scores.total_minutes,
+        }}, kind="week")
+
+        # The running week scores describe the table we just reset
+        if week_scores_repo is not None:
+            await week_scores_repo.delete_by_user_id(user_id)
+
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+
+
+class BatchRolloverResult(BaseModel):
+    archived: int = 0
+    skipped: int = 0
+    failed: int = 0
+    results: dict[uuid.UUID, ChoresResult] = Field(default_factory=dict)
+
+
+async def archive_and_reset_many(
+    user_ids: Iterable[UUID],
+    session_maker: async_sessionmaker,
+    concurrency: int = 4,
+) -> BatchRolloverResult:
+    """
+    Ends the week for many users at once.
+
+    All chores are fetched in one query and scored together with score_many, then every
+    user is archived in their own transaction, at most concurrency at a time. Users that
+    were already archived this week are skipped, so an interrupted run can simply be
+    started again.
+
+    Each transaction first locks the user's chores. A user whose chores were edited since
+    the bulk read is scored again from the locked rows, one whose chores were rolled over
+    by someone else in the meantime is skipped.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    async with session_maker() as session:
+        chores_by_user = await ChoreRepository(session).get_by_user_ids(user_ids)
+        already_archived = await ChoreHistoryRepository(session).get_archived_user_ids(user_ids,
+                                                                                      get_current_week_start())
+
+    to_archive = [user_id for user_id in user_ids if chores_by_user.get(user_id) and user_id not in already_archived]
+    tables = [ChoreTable(table=[chore_row(chore) for chore in chores_by_user[user_id]]) for user_id in to_archive]
+    all_scores = score_many(tables)
+
+    batch_result = BatchRolloverResult()
+    for user_id in user_ids:
+        if user_id in already_archived:
+            batch_result.skipped += 1
+            batch_result.results[user_id] = make_chores_error("Chores for this week have already been archived")
+        elif not chores_by_user.get(user_id):
+            batch_result.skipped += 1
+            batch_result.results[user_id] = make_chore_result([])
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def archive(user_id: UUID, table: ChoreTable, scores: WeekScores):
+        user_chores = chores_by_user[user_id]
+        async with semaphore, session_maker() as session:
+            # Leaving the session rolls back and releases the locks of a user that is not archived
+            try:
+                chore_repo = ChoreRepository(session)
+                locked_chores = await chore_repo.lock_user_chores(user_id)
+                read_weeks = {chore.id: chore.week_start_date for chore in user_chores}
+                if any(read_weeks.get(chore.id, chore.week_start_date) != chore.week_start_date
+                       for chore in locked_chores):
+                    raise WeekAlreadyArchived(user_id)
+                if ({chore.id: chore.updated_at for chore in locked_chores}
+                        != {chore.id: chore.updated_at for chore in user_chores}):
+                    # Changed since the bulk read, score the chores as they are now
+                    user_chores = locked_chores
+                    table = ChoreTable(table=[chore_row(chore) for chore in user_chores])
+                    scores = find_regularities_bitboard(table)
+                if not user_chores:
+                    batch_result.skipped += 1
+                    batch_result.results[user_id] = make_chore_result([])
+                    return
+
+                scores = apply_reward_rules(scores, table.table, [chore.reward_func for chore in user_chores])
+                await archive_user_week(user_id, user_chores, scores,
+                                        chore_repo,
+                                        ChoreHistoryRepository(session),
+                                        RewardRepository(session),
+                                        WeekScoresRepository(session))
+            except WeekAlreadyArchived:
+                batch_result.skipped += 1
+                batch_result.results[user_id] = make_chores_error("Chores for this week have already been archived")
+                return
+            except Exception as e:
+                logger.exception("Failed to end the week for user %s", user_id)
+                batch_result.failed += 1
+                batch_result.results[user_id] = make_chores_error(f"Failed to archive chores: {e}")
+                return
+
+        batch_result.archived += 1
+        reset_chores = [UiChore(id=chore.id, name=chore.name, statuses=RESET_STATUSES, user_id=chore.user_id,
+                                reward_func=chore.reward_func)
+                        for chore in user_chores]
+        batch_result.results[user_id] = ChoresResult.model_construct(result=Ok(ok=reset_chores))
+
+    await asyncio.gather(*(archive(user_id, table, scores)
+                           for user_id, table, scores in zip(to_archive, tables, all_scores)))
+    return batch_result
+
+
+async def rebuild_week_scores(
+    user_id: UUID,
+    chore_repo: ChoreRepository,
+    week_scores_repo: WeekScoresRepository,
+) -> UserWeekScores:
+    """
+    Recomputes the running week scores of a user from their chores and stores them
+    """
+    week_start = get_current_week_start()
+    # Wait for any update of the stored scores in flight, so it can't overwrite the rebuild
+    await week_scores_repo.get_by_user_id_and_week(user_id, week_start, for_update=True)
+
+    user_chores = await chore_repo.get_by_user_id(user_id)
+    table = [chore_row(chore) for chore in user_chores]
+    scores = find_regularities_bitboard(ChoreTable(table=table))
+    return await week_scores_repo.upsert(user_id, week_start, {
+        "chore_ids": [str(chore.id) for chore in user_chores],
+        "table": table,
+        "reward_funcs": [chore.reward_func for chore in user_chores],
+        "scores": scores.model_dump(mode="json"),
+    })
+
+
+async def update_week_scores_for_chore(
+    chore: Chore,
+    chore_repo: ChoreRepository,
+    week_scores_repo: WeekScoresRepository,
+    verify: bool = False,
+) -> UserWeekScores:
+    """
+    Folds a single changed chore into the running week scores of its owner.
+
+    Falls back to a full rebuild when there is no running score for this week yet or
+    the chore is not one of its rows. With verify the result is checked against a
+    full recompute, and rebuilt if it drifted.
+    """
+    return await update_week_scores_for_chores(chore.user_id, [chore], chore_repo, week_scores_repo, verify)
+
+
+async def update_week_scores_for_chores(
+    user_id: UUID,
+    chores: Sequence[Chore],
+    chore_repo: ChoreRepository,
+    week_scores_repo: WeekScoresRepository,
+    verify: bool = False,
+) -> UserWeekScores:
+    """
+    Same as update_week_scores_for_chore for several changed chores of one user, saving once.
+
+    The stored scores stay locked from the read to the save, and the chores are read again
+    once locked, so concurrent changes of the user's chores are folded in one after another
+    and each from the latest state of its chore.
+    """
+    week_scores = await week_scores_repo.get_by_user_id_and_week(user_id, get_current_week_start(),
+                                                                 for_update=True)
+    if week_scores is None or any(str(chore.id) not in week_scores.chore_ids for chore in chores):
+        return await rebuild_week_scores(user_id, chore_repo, week_scores_repo)
+    chores = await chore_repo.get_by_ids([chore.id for chore in chores])
+
+    table = [list(row) for row in week_scores.table]
+    reward_funcs = list(week_scores.reward_funcs or [None] * len(table))
+    scores = WeekScores.model_validate(week_scores.scores)
+    for chore in chores:
+        r = week_scores.chore_ids.index(str(chore.id))
+        scores = rescore_row(table, scores, r, chore_row(chore))
+        reward_funcs[r] = chore.reward_func
+
+    week_scores.table = table
+    week_scores.reward_funcs = reward_funcs
+    week_scores.scores = scores.model_dump(mode="json")
+    week_scores = await week_scores_repo.update_entity(week_scores)
+
+    if verify:
+        drift = await check_week_scores(user_id, chore_repo, week_scores_repo, repair=True)
+        if not drift.in_sync:
+            logger.warning("Week scores of user %s drifted after updating chores %s",
+                           user_id, [str(chore.id) for chore in chores])
+            week_scores = await week_scores_repo.get_by_user_id_and_week(user_id, get_current_week_start())
+
+    return week_scores
+
+
+async def check_week_scores(
+    user_id: UUID,
+    chore_repo: ChoreRepository,
+    week_scores_repo: WeekScoresRepository,
+    repair: bool = False,
+) -> WeekScoresDrift:
+    """
+    Recomputes the week scores of a user from scratch and reports whether the stored
+    running scores drifted from them, optionally replacing the stored scores.
+    """
+    user_chores = await chore_repo.get_by_user_id(user_id)
+    table = [chore_row(chore) for chore in user_chores]
+    expected = find_regularities_bitboard(ChoreTable(table=table))
+
+    week_start = get_current_week_start()
+    week_scores = await week_scores_repo.get_by_user_id_and_week(user_id, week_start)
+    stored = WeekScores.model_validate(week_scores.scores) if week_scores is not None else None
+    in_sync = (
+        week_scores is not None
+        and stored == expected
+        and week_scores.table == table
+        and week_scores.chore_ids == [str(chore.id) for chore in user_chores]
+        and week_scores.reward_funcs == [chore.reward_func for chore in user_chores]
+    )
+
+    drift = WeekScoresDrift(user_id=user_id, week_start_date=week_start, in_sync=in_sync,
+                            stored=stored, expected=expected)
+    if repair and not in_sync:
+        await rebuild_week_scores(user_id, chore_repo, week_scores_repo)
+        drift.repaired = True
+    return drift
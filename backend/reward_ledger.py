@@ -0,0 +1,215 @@
+"""
+Replays the reward_transactions ledger to verify, and optionally repair, the balances
+materialized in the rewards table.
+
+The ledger is streamed in user and version order and the rewards table is read a chunk of
+users at a time, so memory stays bounded whatever the size of the ledger. Repairs are
+guarded by the rewards version, a user whose rewards changed since the replay started is
+left alone.
+"""
+from dataclasses import dataclass
+import math
+from typing import AsyncIterator, Optional
+import uuid
+
+from pydantic import BaseModel
+from sqlalchemy import bindparam, exists, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .models import Reward, RewardTransaction
+from .reward_repository import clamp_balance, utcnow
+
+LEDGER_CHUNK_SIZE = 10000
+
+BALANCE_COLUMNS = ("star_points", "tv_time_points", "game_time_points")
+
+
+@dataclass
+class ReplayedBalance:
+    user_id: uuid.UUID
+    version: int = 0
+    star_points: float = 0
+    tv_time_points: float = 0
+    game_time_points: float = 0
+
+
+class LedgerRebuildResult(BaseModel):
+    users: int = 0
+    transactions: int = 0
+    # Transactions whose recorded balances or version do not follow from the ones before
+    inconsistent_transactions: int = 0
+    # Rewards rows that do not match their replayed ledger, or are missing
+    drifted: int = 0
+    repaired: int = 0
+    # Rewards rows changed since the replay started
+    skipped: int = 0
+    # Rewards rows without any transaction, and how many of them got an opening transaction
+    unledgered: int = 0
+    opened: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return (not self.inconsistent_transactions
+                and self.repaired == self.drifted
+                and self.opened == self.unledgered)
+
+
+def balances_match(balance: ReplayedBalance, star_points: float, tv_time_points: float,
+                   game_time_points: float) -> bool:
+    return (math.isclose(balance.star_points, star_points, abs_tol=1e-6)
+            and math.isclose(balance.tv_time_points, tv_time_points, abs_tol=1e-6)
+            and math.isclose(balance.game_time_points, game_time_points, abs_tol=1e-6))
+
+
+async def replay_ledger(session: AsyncSession, result: LedgerRebuildResult,
+                        chunk_size: int = LEDGER_CHUNK_SIZE) -> AsyncIterator[ReplayedBalance]:
+    """
+    Streams the ledger and yields the replayed balances of every user in it, in user id order
+    """
+    stmt = select(
+        RewardTransaction.user_id,
+        RewardTransaction.version,
+        RewardTransaction.kind,
+        *(getattr(RewardTransaction, column) for column in BALANCE_COLUMNS),
+        *(getattr(RewardTransaction, f"{column}_balance") for column in BALANCE_COLUMNS),
+    ).order_by(RewardTransaction.user_id, RewardTransaction.version).execution_options(yield_per=chunk_size)
+
+    current: Optional[ReplayedBalance] = None
+    async for row in await session.stream(stmt):
+        result.transactions += 1
+        if current is None or row.user_id != current.user_id:
+            if current is not None:
+                yield current
+            current = ReplayedBalance(user_id=row.user_id)
+
+        consistent = row.version == current.version + 1
+        for column in BALANCE_COLUMNS:
+            if row.kind == "opening":
+                value = getattr(row, column)
+            else:
+                value = clamp_balance(column, getattr(current, column) + getattr(row, column))
+            setattr(current, column, value)
+        current.version = row.version
+        if not consistent or not balances_match(current, row.star_points_balance, row.tv_time_points_balance,
+                                                row.game_time_points_balance):
+            result.inconsistent_transactions += 1
+
+    if current is not None:
+        yield current
+
+
+async def find_drift(session: AsyncSession, balances: list[ReplayedBalance],
+                     result: LedgerRebuildResult) -> list[ReplayedBalance]:
+    """
+    Returns the replayed balances that differ from the rewards table
+    """
+    rows = await session.execute(
+        select(Reward.user_id, Reward.version, *(getattr(Reward, column) for column in BALANCE_COLUMNS))
+        .where(Reward.user_id.in_([balance.user_id for balance in balances]))
+    )
+    materialized = {row.user_id: row for row in rows}
+    await session.rollback()
+
+    drifted = []
+    for balance in balances:
+        row = materialized.get(balance.user_id)
+        if row is not None and row.version > balance.version:
+            result.skipped += 1
+        elif (row is None or row.version != balance.version
+              or not balances_match(balance, row.star_points, row.tv_time_points, row.game_time_points)):
+            drifted.append(balance)
+    result.users += len(balances)
+    result.drifted += len(drifted)
+    return drifted
+
+
+async def repair_balances(session: AsyncSession, balances: list[ReplayedBalance]) -> int:
+    """
+    Writes replayed balances to the rewards table, creating missing rows, and returns how
+    many were written
+    """
+    existing = set((await session.scalars(
+        select(Reward.user_id).where(Reward.user_id.in_([balance.user_id for balance in balances]))
+    )).all())
+    now = utcnow()
+    values = [
+        {"b_user_id": balance.user_id, "b_version": balance.version, "updated_at": now,
+         **{column: getattr(balance, column) for column in BALANCE_COLUMNS}}
+        for balance in balances if balance.user_id in existing
+    ]
+    if values:
+        table = Reward.__table__
+        await session.execute(
+            update(table)
+            .where(table.c.user_id == bindparam("b_user_id"), table.c.version <= bindparam("b_version"))
+            .values(version=bindparam("b_version")),
+            values
+        )
+    missing = [
+        {"id": uuid.uuid4(), "user_id": balance.user_id, "version": balance.version, "created_at": now,
+         "updated_at": now, **{column: getattr(balance, column) for column in BALANCE_COLUMNS}}
+        for balance in balances if balance.user_id not in existing
+    ]
+    if missing:
+        await session.execute(insert(Reward), missing)
+    await session.commit()
+    return len(balances)
+
+
+def unledgered_rewards():
+    return ~exists().where(RewardTransaction.user_id == Reward.user_id)
+
+
+async def count_unledgered(session: AsyncSession) -> int:
+    return await session.scalar(select(func.count()).select_from(Reward).where(unledgered_rewards())) or 0
+
+
+async def open_unledgered(session: AsyncSession) -> int:
+    """
+    Records an opening transaction with the current balances of every rewards row without
+    any transaction, and returns how many it opened
+    """
+    rewards = (await session.scalars(select(Reward).where(unledgered_rewards()).with_for_update())).all()
+    now = utcnow()
+    for reward in rewards:
+        reward.version = max(reward.version, 1)
+    if rewards:
+        await session.execute(insert(RewardTransaction), [
+            {"id": uuid.uuid4(), "user_id": reward.user_id, "version": reward.version, "kind": "opening",
+             **{column: getattr(reward, column) for column in BALANCE_COLUMNS},
+             **{f"{column}_balance": getattr(reward, column) for column in BALANCE_COLUMNS},
+             "created_at": now}
+            for reward in rewards
+        ])
+    await session.commit()
+    return len(rewards)
+
+
+async def rebuild_reward_balances(session_maker: async_sessionmaker,
+                                  repair: bool = False,
+                                  chunk_size: int = LEDGER_CHUNK_SIZE) -> LedgerRebuildResult:
+    """
+    Replays the whole ledger and compares the result with the rewards table. With repair the
+    drifted balances are overwritten with the replayed ones, once the replay is done so the
+    ledger is never read and written at the same time.
+    """
+    result = LedgerRebuildResult()
+    drifted: list[ReplayedBalance] = []
+    async with session_maker() as stream_session, session_maker() as session:
+        chunk: list[ReplayedBalance] = []
+        async for balance in replay_ledger(stream_session, result, chunk_size):
+            chunk.append(balance)
+            if len(chunk) >= chunk_size:
+                drifted += await find_drift(session, chunk, result)
+                chunk = []
+        if chunk:
+            drifted += await find_drift(session, chunk, result)
+
+    async with session_maker() as session:
+        if repair:
+            for start in range(0, len(drifted), chunk_size):
+                result.repaired += await repair_balances(session, drifted[start:start + chunk_size])
+        result.unledgered = await count_unledgered(session)
+        if repair and result.unledgered:
+            result.opened = await open_unledgered(session)
+    return result
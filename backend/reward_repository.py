@@ -1,19 +1,51 @@
 from datetime import UTC, datetime
-from typing import Iterable, Optional
+from typing import Iterable, Literal, Optional
+import uuid
 
 from fastapi import Depends
-from sqlalchemy import select
+from sqlalchemy import case, func, insert, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.dialects.postgresql import UUID
 
-from .database import get_async_session
-from .models import Reward
+from .database import get_async_session, get_read_session
+from .models import Reward, RewardTransaction
 from .repository import BaseRepository
 
+MAX_TV_TIME = 60 * 28
+MAX_GAME_TIME = 60 * 28
+
+# Balance column of every reward
+REWARD_COLUMNS = {
+    "star_points": "star_points",
+    "tv_time": "tv_time_points",
+    "game_time": "game_time_points",
+}
+
+# Lowest and highest balance of every column, None leaves that side open
+BALANCE_BOUNDS: dict[str, tuple[Optional[float], Optional[float]]] = {
+    "star_points": (None, None),
+    "tv_time_points": (0, MAX_TV_TIME),
+    "game_time_points": (0, MAX_GAME_TIME),
+}
+
+
+# "opening" transactions set the balances, the others add to them
+RewardTransactionKind = Literal["opening", "update", "week"]
+
 
 def utcnow():
     return datetime.now(UTC)
 
 
+def clamp_balance(column: str, value: float) -> float:
+    low, high = BALANCE_BOUNDS[column]
+    if low is not None:
+        value = max(low, value)
+    if high is not None:
+        value = min(high, value)
+    return value
+
+
 class RewardRepository(BaseRepository[Reward]):
     @property
     def model(self) -> type[Reward]:
@@ -31,7 +63,106 @@ class RewardRepository(BaseRepository[Reward]):
         entity = result.scalars().first()
         return entity
 
+    async def add_to_balances(self,
+                              deltas: dict[UUID, dict[str, float]],
+                              kind: RewardTransactionKind,
+                              created_by_id: Optional[UUID] = None) -> dict[UUID, Reward]:
+        """
+        Adds amounts to the balances of many users, deltas mapping a user id to the amount
+        to add to each balance column, and returns the updated rewards by user id.
+
+        Balances are computed and clamped to BALANCE_BOUNDS inside the database, in a single
+        INSERT ... ON CONFLICT DO UPDATE that also creates missing rewards, so concurrent
+        changes never overwrite each other. Every change is recorded in the reward_transactions
+        ledger with a second INSERT. The caller commits.
+        """
+        if not deltas:
+            return {}
+
+        dialect = self.session.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            rewards = await self._upsert_balances(deltas, dialect)
+        else:
+            rewards = await self._add_to_balances_in_python(deltas)
+
+        await self.session.execute(insert(RewardTransaction), [
+            {
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "version": rewards[user_id].version,
+                "kind": kind,
+                "star_points": user_deltas.get("star_points", 0),
+                "tv_time_points": user_deltas.get("tv_time_points", 0),
+                "game_time_points": user_deltas.get("game_time_points", 0),
+                "star_points_balance": rewards[user_id].star_points,
+                "tv_time_points_balance": rewards[user_id].tv_time_points,
+                "game_time_points_balance": rewards[user_id].game_time_points,
+                "created_by_id": created_by_id,
+                "created_at": rewards[user_id].updated_at,
+            }
+            for user_id, user_deltas in deltas.items()
+        ])
+        return rewards
+
+    async def _upsert_balances(self, deltas: dict[UUID, dict[str, float]], dialect: str) -> dict[UUID, Reward]:
+        if dialect == "postgresql":
+            upsert, greatest, least = postgresql.insert, func.greatest, func.least
+        else:
+            # The multi-argument min and max of SQLite are scalar functions
+            upsert, greatest, least = sqlite.insert, func.max, func.min
+
+        columns = sorted({column for user_deltas in deltas.values() for column in user_deltas})
+        now = utcnow()
+        rows = [
+            {"id": uuid.uuid4(), "user_id": user_id, "version": 1, "created_at": now, "updated_at": now,
+             **{column: clamp_balance(column, user_deltas.get(column, 0)) for column in columns}}
+            for user_id, user_deltas in deltas.items()
+        ]
+
+        new_balances = {"version": self.model.version + 1, "updated_at": now}
+        for column in columns:
+            amounts = {user_id: user_deltas.get(column, 0) for user_id, user_deltas in deltas.items()}
+            if len(set(amounts.values())) == 1:
+                amount = literal(next(iter(amounts.values())))
+            else:
+                amount = case(amounts, value=self.model.user_id, else_=0)
+            balance = getattr(self.model, column) + amount
+            low, high = BALANCE_BOUNDS[column]
+            if low is not None:
+                balance = greatest(balance, low)
+            if high is not None:
+                balance = least(balance, high)
+            new_balances[column] = balance
+
+        stmt = upsert(self.model).values(rows).on_conflict_do_update(
+            index_elements=["user_id"], set_=new_balances
+        )
+        result = await self.session.scalars(stmt.returning(self.model),
+                                            execution_options={"populate_existing": True})
+        return {reward.user_id: reward for reward in result.all()}
+
+    async def _add_to_balances_in_python(self, deltas: dict[UUID, dict[str, float]]) -> dict[UUID, Reward]:
+        result = await self.session.scalars(
+            select(self.model).filter(self.model.user_id.in_(list(deltas))).with_for_update()
+        )
+        rewards = {reward.user_id: reward for reward in result.all()}
+        for user_id, user_deltas in deltas.items():
+            reward = rewards.get(user_id)
+            if reward is None:
+                reward = rewards[user_id] = self.model(user_id=user_id, star_points=0, tv_time_points=0,
+                                                       game_time_points=0, version=0)
+                self.session.add(reward)
+            for column, amount in user_deltas.items():
+                setattr(reward, column, clamp_balance(column, getattr(reward, column) + amount))
+            reward.version += 1
+            reward.updated_at = utcnow()
+        await self.session.flush()
+        return rewards
 
 
 async def get_reward_db(session=Depends(get_async_session)):
     yield RewardRepository(session)
+
+
+async def get_reward_read_db(session=Depends(get_read_session)):
+    yield RewardRepository(session)
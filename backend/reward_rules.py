@@ -0,0 +1,264 @@
+"""
+Per-chore reward rules stored in Chore.reward_func.
+
+A rule is a small arithmetic expression such as "10 if x == 7 else x - 2 * o" that
+returns the extra minutes a chore row earns for the week. Rules are parsed with the
+ast module, checked against a whitelist and compiled into closures, nothing is eval'd.
+"""
+import ast
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import operator
+import time
+from typing import Any, Callable, Iterable, Mapping, Optional
+
+from pydantic import BaseModel
+
+
+MAX_RULE_LENGTH = 256
+MAX_EXPONENT = 8
+MAX_POWER_BASE = 10 ** 6
+
+RULE_VARIABLES = ("x", "o", "blank", "days", "x_triplets", "o_triplets", "perfect")
+
+RuleFunc = Callable[[Mapping[str, int]], Any]
+
+
+class RewardRuleError(ValueError):
+    pass
+
+
+def _power(base, exponent):
+    if abs(exponent) > MAX_EXPONENT or abs(base) > MAX_POWER_BASE:
+        raise RewardRuleError(f"Powers are limited to {MAX_POWER_BASE} ** {MAX_EXPONENT}")
+    return operator.pow(base, exponent)
+
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _power,
+}
+
+UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Not: operator.not_,
+}
+
+COMPARISON_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+FUNCTIONS = {
+    "min": min,
+    "max": max,
+    "abs": abs,
+    "round": round,
+}
+
+
+def _compile_node(node: ast.AST) -> RuleFunc:
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body)
+
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise RewardRuleError(f"Unsupported constant {node.value!r}")
+        value = node.value
+        return lambda env: value
+
+    if isinstance(node, ast.Name):
+        if node.id not in RULE_VARIABLES:
+            raise RewardRuleError(f"Unknown variable '{node.id}', expected one of {', '.join(RULE_VARIABLES)}")
+        name = node.id
+        return lambda env: env[name]
+
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        op = BINARY_OPERATORS[type(node.op)]
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda env: op(left(env), right(env))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        op = UNARY_OPERATORS[type(node.op)]
+        operand = _compile_node(node.operand)
+        return lambda env: op(operand(env))
+
+    if isinstance(node, ast.BoolOp):
+        values = [_compile_node(value) for value in node.values]
+        stop_when = not isinstance(node.op, ast.And)
+
+        def boolean(env):
+            # Like Python, evaluates to the operand that decided the outcome, not to a bool
+            for value in values[:-1]:
+                result = value(env)
+                if bool(result) == stop_when:
+                    return result
+            return values[-1](env)
+        return boolean
+
+    if isinstance(node, ast.Compare) and all(type(op) in COMPARISON_OPERATORS for op in node.ops):
+        operands = [_compile_node(node.left)] + [_compile_node(comparator) for comparator in node.comparators]
+        ops = [COMPARISON_OPERATORS[type(op)] for op in node.ops]
+
+        def compare(env):
+            values = [operand(env) for operand in operands]
+            return all(op(a, b) for op, a, b in zip(ops, values, values[1:]))
+        return compare
+
+    if isinstance(node, ast.IfExp):
+        test, body, orelse = _compile_node(node.test), _compile_node(node.body), _compile_node(node.orelse)
+        return lambda env: body(env) if test(env) else orelse(env)
+
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS
+            and not node.keywords):
+        function = FUNCTIONS[node.func.id]
+        args = [_compile_node(arg) for arg in node.args]
+        return lambda env: function(*(arg(env) for arg in args))
+
+    raise RewardRuleError(f"Unsupported expression: {ast.unparse(node)}")
+
+
+def compile_rule(source: str) -> RuleFunc:
+    """
+    Parses and compiles a rule, raising RewardRuleError if it is not allowed
+    """
+    if len(source) > MAX_RULE_LENGTH:
+        raise RewardRuleError(f"Rules are limited to {MAX_RULE_LENGTH} characters")
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise RewardRuleError(f"Invalid rule: {e.msg}")
+    return _compile_node(tree)
+
+
+def row_variables(row: list[str]) -> dict[str, int]:
+    """
+    Returns the variables a rule can use for a single chore row
+    """
+    x_triplets = o_triplets = 0
+    run_status, run_length = None, 0
+    for status in row:
+        run_length = run_length + 1 if status == run_status else 1
+        run_status = status
+        if run_length == 3:
+            run_length = 0
+            run_status = None
+            if status == 'X':
+                x_triplets += 1
+            elif status == 'O':
+                o_triplets += 1
+
+    x = row.count('X')
+    return {
+        "x": x,
+        "o": row.count('O'),
+        "blank": len(row) - x - row.count('O'),
+        "days": len(row),
+        "x_triplets": x_triplets,
+        "o_triplets": o_triplets,
+        "perfect": int(x == len(row)),
+    }
+
+
+class RewardRuleStats(BaseModel):
+    rule: str
+    calls: int
+    total_seconds: float
+    compile_seconds: float
+    errors: int
+
+
+@dataclass
+class RewardRule:
+    source: str
+    func: RuleFunc
+    compile_seconds: float
+    calls: int = 0
+    total_seconds: float = 0.0
+    errors: int = 0
+
+    def evaluate_many(self, rows: Iterable[list[str]]) -> int:
+        """
+        Evaluates the rule for every row and returns the total minutes earned
+        """
+        start = time.perf_counter()
+        minutes = 0
+        for row in rows:
+            self.calls += 1
+            try:
+                minutes += int(self.func(row_variables(row)))
+            except (ArithmeticError, ValueError, TypeError):
+                # A rule that blows up for a row earns nothing for it
+                self.errors += 1
+        self.total_seconds += time.perf_counter() - start
+        return minutes
+
+    def stats(self) -> RewardRuleStats:
+        return RewardRuleStats(rule=self.source,
+                               calls=self.calls,
+                               total_seconds=self.total_seconds,
+                               compile_seconds=self.compile_seconds,
+                               errors=self.errors)
+
+
+@dataclass
+class RewardRuleRegistry:
+    """
+    Content addressed cache of compiled rules, bounded to the max_rules most recently used
+    """
+    max_rules: int = 4096
+    _rules: OrderedDict[str, RewardRule] = field(default_factory=OrderedDict)
+
+    def get(self, source: str) -> RewardRule:
+        rule = self._rules.get(source)
+        if rule is not None:
+            self._rules.move_to_end(source)
+            return rule
+
+        start = time.perf_counter()
+        func = compile_rule(source)
+        rule = RewardRule(source=source, func=func, compile_seconds=time.perf_counter() - start)
+        self._rules[source] = rule
+        if len(self._rules) > self.max_rules:
+            self._rules.popitem(last=False)
+        return rule
+
+    def validate(self, source: Optional[str]) -> None:
+        if source:
+            self.get(source)
+
+    def evaluate(self, table: list[list[str]], reward_funcs: Iterable[Optional[str]]) -> int:
+        """
+        Returns the extra minutes earned by the rules of a table, reward_funcs being the
+        rule of every row in row order. Rows sharing a rule are evaluated together.
+        """
+        rows_by_rule: dict[str, list[list[str]]] = {}
+        for row, source in zip(table, reward_funcs):
+            if source:
+                rows_by_rule.setdefault(source, []).append(row)
+
+        minutes = 0
+        for source, rows in rows_by_rule.items():
+            try:
+                rule = self.get(source)
+            except RewardRuleError:
+                # Rules are validated when chores are saved, anything older is ignored
+                continue
+            minutes += rule.evaluate_many(rows)
+        return minutes
+
+    def stats(self) -> list[RewardRuleStats]:
+        return [rule.stats() for rule in self._rules.values()]
+
+
+reward_rules = RewardRuleRegistry()
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .chore_repository import ChoreHistoryRepository, ChoreRepository
+from .models import ChoreTable, get_current_week_start
+from .reward_calculator import (BatchRolloverResult, WeekAlreadyArchived, apply_reward_rules, archive_user_week,
+                                chore_row, find_regularities_bitboard, make_chore_result, make_chores_error)
+from .reward_repository import RewardRepository
+from .score_repository import WeekScoresRepository
+
+logger = logging.getLogger(__name__)
+
+
+async def roll_over_due_users(session_maker: async_sessionmaker, concurrency: int = 4) -> BatchRolloverResult:
+    """
+    Archives and resets every chore left over from a previous week.
+
+    Each user is handled in its own transaction that first locks their due chores with
+    SELECT ... FOR UPDATE SKIP LOCKED, so any number of processes can run this at the
+    same time. The unique (chore_id, week_start_date) constraint on chore_history backs
+    this up on databases without row locks.
+    """
+    week_start = get_current_week_start()
+    async with session_maker() as session:
+        user_ids = await ChoreRepository(session).get_due_user_ids(week_start)
+
+    batch_result = BatchRolloverResult()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def roll_over(user_id):
+        async with semaphore, session_maker() as session:
+            chore_repo = ChoreRepository(session)
+            due_chores = await chore_repo.lock_user_chores_due(user_id, week_start)
+            if not due_chores:
+                # Another worker got to them first
+                await session.rollback()
+                batch_result.skipped += 1
+                batch_result.results[user_id] = make_chore_result([])
+                return
+
+            table = ChoreTable(table=[chore_row(chore) for chore in due_chores])
+            scores = apply_reward_rules(find_regularities_bitboard(table), table.table,
+                                        [chore.reward_func for chore in due_chores])
+            try:
+                await archive_user_week(user_id, due_chores, scores, chore_repo,
+                                        ChoreHistoryRepository(session),
+                                        RewardRepository(session),
+                                        WeekScoresRepository(session))
+            except WeekAlreadyArchived:
+                batch_result.skipped += 1
+                batch_result.results[user_id] = make_chores_error("Chores for this week have already been archived")
+                return
+            except Exception as e:
+                logger.exception("Scheduled rollover failed for user %s", user_id)
+                batch_result.failed += 1
+                batch_result.results[user_id] = make_chores_error(f"Failed to archive chores: {e}")
+                return
+
+        batch_result.archived += 1
+        batch_result.results[user_id] = make_chore_result(due_chores)
+
+    await asyncio.gather(*(roll_over(user_id) for user_id in user_ids))
+    return batch_result
+
+
+class RolloverScheduler:
+    """
+    Background task that rolls over the week of every user whose chores are from a past week
+    """
+
+    def __init__(self, session_maker: async_sessionmaker, interval_seconds: float, concurrency: int = 4):
+        self.session_maker = session_maker
+        self.interval_seconds = interval_seconds
+        self.concurrency = concurrency
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> BatchRolloverResult:
+        result = await roll_over_due_users(self.session_maker, self.concurrency)
+        if result.results:
+            logger.info("Scheduled rollover: %d archived, %d skipped, %d failed",
+                        result.archived, result.skipped, result.failed)
+        return result
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Scheduled rollover failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever(), name="rollover-scheduler")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+import hashlib
+import json
+import time
+from typing import Callable
+
+from pydantic import BaseModel
+
+from .models import ChoreTable, WeekScores
+
+
+class ScoresCacheStats(BaseModel):
+    size: int
+    max_size: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+
+
+def table_digest(chore_table: ChoreTable) -> bytes:
+    """
+    Returns a canonical content hash of a chore table
+    """
+    canonical = json.dumps(chore_table.table, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode(), digest_size=16).digest()
+
+
+class ScoresCache:
+    """
+    Bounded LRU cache of WeekScores keyed by the content hash of the scored table.
+
+    Entries older than ttl_seconds are treated as misses. Cached scores are shared
+    between callers and must not be mutated.
+    """
+
+    def __init__(self,
+                 score_table: Callable[[ChoreTable], WeekScores],
+                 max_size: int = 1024,
+                 ttl_seconds: float = 300.0):
+        self.score_table = score_table
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[bytes, tuple[float, WeekScores]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_scores(self, chore_table: ChoreTable) -> WeekScores:
+        if self.max_size <= 0:
+            self.misses += 1
+            return self.score_table(chore_table)
+
+        key = table_digest(chore_table)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, scores = entry
+            if now < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return scores
+            del self._entries[key]
+            self.expirations += 1
+
+        self.misses += 1
+        scores = self.score_table(chore_table)
+        self._entries[key] = (now + self.ttl_seconds, scores)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return scores
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> ScoresCacheStats:
+        return ScoresCacheStats(
+            size=len(self._entries),
+            max_size=self.max_size,
+            ttl_seconds=self.ttl_seconds,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            expirations=self.expirations,
+        )
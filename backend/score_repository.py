@@ -0,0 +1,76 @@
+from datetime import date
+from typing import Any, Optional
+import uuid
+
+from fastapi import Depends
+from sqlalchemy import and_, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .database import get_async_session
+from .models import UserWeekScores
+from .repository import BaseRepository
+
+
+class WeekScoresRepository(BaseRepository[UserWeekScores]):
+    @property
+    def model(self) -> type[UserWeekScores]:
+        return UserWeekScores
+
+    async def get_by_user_id_and_week(self, user_id: UUID, week_start_date: date,
+                                      for_update: bool = False) -> Optional[UserWeekScores]:
+        """
+        With for_update the row stays locked until the transaction ends, for read-modify-write
+        updates that must not interleave with another one
+        """
+        stmt = select(self.model).filter(
+            and_(
+                self.model.user_id == user_id,
+                self.model.week_start_date == week_start_date
+            )
+        )
+        if for_update:
+            stmt = stmt.with_for_update()
+        result = await self.session.execute(stmt, execution_options={"populate_existing": for_update})
+        return result.scalars().first()
+
+    async def upsert(self, user_id: UUID, week_start_date: date, values: dict[str, Any]) -> UserWeekScores:
+        """
+        Stores the week scores of a user, replacing the ones already stored for that week,
+        in a single INSERT ... ON CONFLICT DO UPDATE where the dialect supports it
+        """
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            insert = postgresql.insert
+        elif dialect == "sqlite":
+            insert = sqlite.insert
+        else:
+            week_scores = await self.get_by_user_id_and_week(user_id, week_start_date, for_update=True)
+            if week_scores is None:
+                return await self.add({"user_id": user_id, "week_start_date": week_start_date, **values})
+            for key, value in values.items():
+                setattr(week_scores, key, value)
+            return await self.update_entity(week_scores)
+
+        stmt = insert(self.model).values(
+            id=uuid.uuid4(), user_id=user_id, week_start_date=week_start_date, **values
+        ).on_conflict_do_update(
+            index_elements=["user_id", "week_start_date"], set_=values
+        )
+        result = await self.session.scalars(stmt.returning(self.model),
+                                            execution_options={"populate_existing": True})
+        week_scores = result.one()
+        await self.session.commit()
+        return week_scores
+
+    async def delete_by_user_id(self, user_id: UUID) -> None:
+        """
+        Drops all running week scores of the user, without committing
+        """
+        await self.session.execute(delete(self.model).where(self.model.user_id == user_id))
+
+
+async def get_week_scores_db(session: AsyncSession = Depends(get_async_session)):
+    yield WeekScoresRepository(session)
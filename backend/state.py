@@ -1,26 +1,37 @@
 from contextlib import asynccontextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import logging
 import os
+import time
+from typing import Callable
 from typing_extensions import AsyncIterator
 import uuid
 
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi_users import FastAPIUsers
-from fastapi_users.authentication import AuthenticationBackend, BearerTransport
+from fastapi_users.authentication import BearerTransport
 from sqlalchemy.ext.asyncio import AsyncEngine
 
-from backend.user_repository import UserCreate, UserRead, UserUpdate, get_jwt_strategy, get_user_manager
+from backend.user_repository import (RefreshingAuthenticationBackend, UserCreate, UserRead, UserUpdate, get_jwt_strategy,
+                                     get_user_manager)
 
-from .database import db_state, DBState
-from .models import Base, User
+from .database import db_state, DBState, schema_is_current
+from .models import Base, ChoreTable, User, WeekScores
+from .reward_calculator import get_scoring_engine
+from .rollover_scheduler import RolloverScheduler
+from .score_cache import ScoresCache
 from .settings import DailyDriveSettings
+from .passwords import password_helper
+from .user_cache import user_cache
 
 
+logger = logging.getLogger(__name__)
+
 bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
-auth_backend = AuthenticationBackend(name="jwt",
-                                     transport=bearer_transport,
-                                     get_strategy=get_jwt_strategy)
+auth_backend = RefreshingAuthenticationBackend(name="jwt",
+                                               transport=bearer_transport,
+                                               get_strategy=get_jwt_strategy)
 
 fastapi_users = FastAPIUsers[User, uuid.UUID](get_user_manager, [auth_backend])
 current_active_user = fastapi_users.current_user(active=True)
@@ -31,6 +42,9 @@ current_superuser = fastapi_users.current_user(active=True, superuser=True)
 class DailyDriveState:
     settings: DailyDriveSettings
     db_state: DBState
+    score_table: Callable[[ChoreTable], WeekScores]
+    scores_cache: ScoresCache
+    startup_timings: dict[str, float] = field(default_factory=dict)
 
 
 async def create_db_and_tables(engine: AsyncEngine):
@@ -38,16 +52,10 @@ async def create_db_and_tables(engine: AsyncEngine):
         await conn.run_sync(Base.metadata.create_all)
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI) -> AsyncIterator[dict[str, DailyDriveState]]:
-
-    settings = DailyDriveSettings()
-    app.mount(settings.backend_public_url,
-              StaticFiles(directory=os.path.join(os.path.dirname(__file__),
-              "../public")),
-              name="static")
-    db_state.init(settings.database_url)
-
+def include_auth_routers(app: FastAPI):
+    """
+    Adds the fastapi-users routes, once when the app is created rather than on every startup
+    """
     app.include_router(
         fastapi_users.get_auth_router(auth_backend), prefix="/auth/jwt", tags=["auth"]
     )
@@ -72,9 +80,76 @@ async def lifespan(app: FastAPI) -> AsyncIterator[dict[str, DailyDriveState]]:
         tags=["users"],
     )
 
-    # Not needed if you setup a migration system like Alembic
+
+class StartupTimer:
+    """
+    Records how long each startup phase takes
+    """
+
+    def __init__(self):
+        self.started_at = self.last = time.perf_counter()
+        self.phases: dict[str, float] = {}
+
+    def phase(self, name: str):
+        now = time.perf_counter()
+        self.phases[name] = now - self.last
+        self.last = now
+
+    def report(self) -> dict[str, float]:
+        timings = {**self.phases, "total": self.last - self.started_at}
+        logger.info("Started in %s", ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in timings.items()))
+        return timings
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[dict[str, DailyDriveState]]:
+    timer = StartupTimer()
+    settings = DailyDriveSettings()
+    app.mount(settings.backend_public_url,
+              StaticFiles(directory=os.path.join(os.path.dirname(__file__),
+              "../public")),
+              name="static")
+    timer.phase("settings")
+
+    db_state.init(settings.database_url, settings)
+    timer.phase("database")
+
     assert db_state.engine is not None
-    await create_db_and_tables(db_state.engine)
-    yield {"daily_drive_state": DailyDriveState(settings=settings,
-                                                db_state=db_state,
-          ),}
+    if settings.schema_startup == "create_all":
+        await create_db_and_tables(db_state.engine)
+    elif settings.schema_startup == "check":
+        # Reflecting every table is only needed when migrations have not been run
+        if not await schema_is_current(db_state.engine):
+            await create_db_and_tables(db_state.engine)
+    timer.phase("schema")
+
+    assert db_state.async_session_maker is not None
+    scheduler = RolloverScheduler(db_state.async_session_maker,
+                                  interval_seconds=settings.rollover_interval_seconds,
+                                  concurrency=settings.rollover_concurrency)
+    # Everything from the scheduler start on is undone in the finally, also when a later
+    # startup phase fails
+    try:
+        if settings.rollover_scheduler_enabled:
+            scheduler.start()
+        timer.phase("scheduler")
+
+        score_table = get_scoring_engine(settings.scoring_engine)
+        scores_cache = ScoresCache(score_table,
+                                   max_size=settings.scores_cache_size,
+                                   ttl_seconds=settings.scores_cache_ttl_seconds)
+        timer.phase("scoring")
+
+        user_cache.configure(max_size=settings.user_cache_size, ttl_seconds=settings.user_cache_ttl_seconds)
+        password_helper.configure(workers=settings.password_hash_workers,
+                                  time_cost=settings.password_hash_time_cost,
+                                  memory_cost_kib=settings.password_hash_memory_cost_kib)
+        yield {"daily_drive_state": DailyDriveState(settings=settings,
+                                                    db_state=db_state,
+                                                    score_table=score_table,
+                                                    scores_cache=scores_cache,
+                                                    startup_timings=timer.report(),
+              ),}
+    finally:
+        await scheduler.stop()
+        password_helper.shutdown()
@@ -0,0 +1,98 @@
+"""
+Statement budgets of the hot routes, read from the X-DB-Queries header the app reports in
+debug mode. Raise a budget only along with the change that needs the extra statement.
+"""
+import asyncio
+import uuid
+
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.query_stats import assert_query_budget, count_queries, track_queries
+from backend.reward_calculator import WEEKDAYS
+
+CHORES = 10
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("database_url", f"sqlite+aiosqlite:///{tmp_path_factory.mktemp('budgets') / 'app.db'}")
+        monkeypatch.setenv("debug", "true")
+        monkeypatch.setenv("schema_startup", "create_all")
+        monkeypatch.setenv("rollover_scheduler_enabled", "false")
+        monkeypatch.setenv("password_hash_time_cost", "1")
+        monkeypatch.setenv("password_hash_memory_cost_kib", "1024")
+        from backend.main import app
+
+        with TestClient(app) as client:
+            yield client
+
+
+@pytest.fixture(scope="module")
+def user(client):
+    client.post("/auth/register", json={"email": "budget@example.com", "password": "Passw0rdA", "name": "B"})
+    token = client.post("/auth/jwt/login",
+                        data={"username": "budget@example.com", "password": "Passw0rdA"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/api/v1/users/me", headers=headers).json()["id"]
+    chore_ids = [
+        client.post("/api/v1/chores", headers=headers,
+                    json={"id": str(uuid.uuid4()), "name": f"chore {i}", "statuses": {day: "X" for day in WEEKDAYS}}
+                    ).json()["id"]
+        for i in range(CHORES)
+    ]
+    return headers, user_id, chore_ids
+
+
+def test_get_chores_budget(client, user):
+    headers, _, _ = user
+    assert_query_budget(client.get("/api/v1/chores", headers=headers), 1)
+
+
+def test_get_scores_budget(client, user):
+    headers, _, _ = user
+    response = client.post("/api/v1/get_scores", headers=headers, json={"table": [["X"] * 7] * CHORES})
+    assert_query_budget(response, 2)
+
+
+def test_update_chore_statuses_budget(client, user):
+    headers, _, chore_ids = user
+    changes = [{"chore_id": chore_id, "weekday": "Monday", "status": "O"} for chore_id in chore_ids]
+    assert_query_budget(client.patch("/api/v1/chores/statuses", headers=headers, json=changes), 6)
+
+
+def test_get_rewards_budget(client, user):
+    headers, user_id, _ = user
+    assert_query_budget(client.get("/api/v1/rewards", headers=headers, params={"user_id": user_id}), 1)
+
+
+def test_update_rewards_budget(client, user):
+    headers, user_id, _ = user
+    update = {"operation": "add", "reward": "tv_time", "amount": 5, "target_user_id": user_id}
+    assert_query_budget(client.post("/api/v1/rewards/update", headers=headers, json=update), 2)
+
+
+def test_unknown_reward_is_rejected(client, user):
+    headers, user_id, _ = user
+    update = {"operation": "add", "reward": "pony_rides", "amount": 5, "target_user_id": user_id}
+    assert client.post("/api/v1/rewards/update", headers=headers, json=update).status_code == 400
+    valid = {**update, "reward": "tv_time"}
+    assert client.post("/api/v1/rewards/batch", headers=headers, json=[valid, update]).status_code == 400
+
+
+def test_failed_statements_do_not_leak_start_times():
+    async def fail_statement():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        track_queries(engine)
+        async with engine.connect() as conn:
+            with count_queries():
+                with pytest.raises(exc.OperationalError):
+                    await conn.execute(text("SELECT * FROM missing_table"))
+            start_times = (await conn.get_raw_connection()).info.get("query_start_times")
+        await engine.dispose()
+        return start_times
+
+    assert not asyncio.run(fail_statement())
@@ -0,0 +1,16 @@
+import asyncio
+
+from backend.benchmarks.query_plans import check_query_plans
+
+FAMILY_LOOKUPS = {
+    "FamilyRepository.get_user_family_ids",
+    "FamilyRepository.shares_family",
+    "FamilyRepository.get_members_among",
+}
+
+
+def test_repository_lookups_use_indexes():
+    plans = asyncio.run(check_query_plans(users=20, chores=5, weeks=4))
+    assert FAMILY_LOOKUPS <= {plan.name for plan in plans}
+    scans = {plan.name: plan.sequential_scans for plan in plans if plan.sequential_scans}
+    assert not scans, f"Repository lookups read whole tables: {scans}"
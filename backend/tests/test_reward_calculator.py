@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from backend.models import ChoreTable
+from backend.reward_calculator import (WEEKDAYS, find_regularities_bitboard, find_regularities_with_locations,
+                                      rescore_row, score_many, summarize_table)
+
+STATUSES = ["X", "X", "O", "_"]
+
+
+def random_tables(count: int, seed: int, max_rows: int = 12) -> list[ChoreTable]:
+    rng = random.Random(seed)
+    return [ChoreTable(table=[[rng.choice(STATUSES) for _ in WEEKDAYS] for _ in range(rng.randint(0, max_rows))])
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bitboard_matches_reference(seed):
+    for table in random_tables(500, seed):
+        assert find_regularities_bitboard(table) == find_regularities_with_locations(table), table.table
+
+
+@pytest.mark.parametrize("table", [
+    [],
+    [["X"] * 7],
+    [["O"] * 7],
+    [["X"] * 7] * 4,
+    [["X", "X", "X", "X", "X", "X", "_"]] * 6,
+    [["O", "O", "O", "X", "X", "X", "O"]] * 3,
+])
+def test_bitboard_matches_reference_edge_cases(table):
+    chore_table = ChoreTable(table=table)
+    assert find_regularities_bitboard(chore_table) == find_regularities_with_locations(chore_table)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_score_many_matches_reference(seed):
+    tables = random_tables(300, seed)
+    assert score_many(tables) == [find_regularities_with_locations(table) for table in tables]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_rescore_row_matches_full_rescore(seed):
+    rng = random.Random(seed)
+    for chore_table in random_tables(200, seed, max_rows=8):
+        if not chore_table.table:
+            continue
+        table = [list(row) for row in chore_table.table]
+        scores = find_regularities_with_locations(chore_table)
+        for _ in range(5):
+            r = rng.randrange(len(table))
+            new_row = [rng.choice(STATUSES) for _ in WEEKDAYS]
+            scores = rescore_row(table, scores, r, new_row)
+            assert scores == find_regularities_with_locations(ChoreTable(table=table)), table
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_summarize_table_matches_reference(seed):
+    for table in random_tables(500, seed):
+        scores = find_regularities_with_locations(table)
+        tally = summarize_table(table)
+        assert (tally.total_points, tally.horizontal_X, tally.horizontal_O, tally.vertical_X, tally.full_X_columns,
+                tally.total_minutes) == (scores.total_points, len(scores.horizontal_X_triplets),
+                                         len(scores.horizontal_O_triplets), len(scores.vertical_X_triplets),
+                                         len(scores.full_X_columns), scores.total_minutes), table.table
@@ -0,0 +1,19 @@
+import pytest
+
+from backend.reward_rules import compile_rule
+
+ENV = {"x": 5, "o": 0, "blank": 2, "days": 7, "x_triplets": 1, "o_triplets": 0, "perfect": 0}
+
+
+@pytest.mark.parametrize("rule", [
+    "x >= 5 and 15",
+    "x > 5 and 15",
+    "o or 3",
+    "x or 3",
+    "o or blank or 4",
+    "x and o and 4",
+    "10 if x >= 5 and o == 0 else 0",
+    "x > 1 and o or 4",
+])
+def test_boolean_operators_match_python(rule):
+    assert compile_rule(rule)(ENV) == eval(rule, {}, dict(ENV))
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import timedelta
+import uuid
+
+import pytest
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.chore_repository import ChoreHistoryRepository, ChoreRepository
+from backend.models import Base, Chore, ChoreHistory, User
+from backend.query_stats import assert_max_queries, track_queries
+from backend.reward_calculator import WEEKDAYS, archive_and_reset_user_chores, get_current_week_start
+from backend.reward_repository import RewardRepository
+from backend.score_repository import WeekScoresRepository
+
+CHORES = 30
+# Chores, archived week lookup, history insert, reset, rewards upsert, ledger insert and
+# week scores delete, whatever the number of chores
+MAX_STATEMENTS = 7
+
+
+async def archive_week(db_path, week_start_date) -> tuple[int, int]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    track_queries(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    user_id = uuid.uuid4()
+    async with session_maker() as session:
+        session.add(User(id=user_id, email="rollover@example.com", hashed_password="x"))
+        session.add_all(Chore(name=f"chore {i}", user_id=user_id, week_start_date=week_start_date,
+                              statuses={day: "X" if (i + d) % 3 else "O" for d, day in enumerate(WEEKDAYS)})
+                        for i in range(CHORES))
+        await session.commit()
+
+    async with session_maker() as session:
+        with assert_max_queries(MAX_STATEMENTS):
+            result = await archive_and_reset_user_chores(user_id, ChoreRepository(session),
+                                                         ChoreHistoryRepository(session),
+                                                         RewardRepository(session), WeekScoresRepository(session))
+        assert "ok" in result.result.model_dump(exclude_none=True)
+
+        archived = await session.scalar(select(func.count()).select_from(ChoreHistory))
+        next_week_start = max(get_current_week_start(), week_start_date + timedelta(days=7))
+        reset = await session.scalar(select(func.count()).select_from(Chore)
+                                     .where(Chore.week_start_date == next_week_start))
+    await engine.dispose()
+    return archived, reset
+
+
+@pytest.mark.parametrize("weeks_ago", [1, 0])
+def test_archive_and_reset_user_chores_statement_budget(tmp_path, weeks_ago):
+    # Chores are reset to the week after the archived one, also when it is ended early
+    week_start_date = get_current_week_start() - timedelta(days=7 * weeks_ago)
+    archived, reset = asyncio.run(archive_week(tmp_path / "rollover.db", week_start_date))
+    assert archived == CHORES
+    assert reset == CHORES
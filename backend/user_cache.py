@@ -0,0 +1,94 @@
+from collections import OrderedDict
+import time
+from typing import Any, Optional
+import uuid
+
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from .models import User
+
+
+class UserCacheStats(BaseModel):
+    size: int
+    max_size: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+
+
+class UserCache:
+    """
+    Bounded LRU cache of the users resolved from auth tokens, keyed by user id.
+
+    Entries hold the column values of a user and every hit builds a fresh detached User
+    from them, so callers never share an instance. Entries older than ttl_seconds are
+    treated as misses. The cache is per process, a change made by another process shows
+    up here once the entry expires.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 30.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[uuid.UUID, tuple[float, dict[str, Any]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def configure(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clear()
+
+    def get(self, user_id: uuid.UUID) -> Optional[User]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            expires_at, values = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                user = User(**values)
+                make_transient_to_detached(user)
+                return user
+            del self._entries[user_id]
+            self.expirations += 1
+        self.misses += 1
+        return None
+
+    def put(self, user: User):
+        if self.max_size <= 0:
+            return
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        self._entries[user.id] = (time.monotonic() + self.ttl_seconds, values)
+        self._entries.move_to_end(user.id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: uuid.UUID):
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> UserCacheStats:
+        return UserCacheStats(
+            size=len(self._entries),
+            max_size=self.max_size,
+            ttl_seconds=self.ttl_seconds,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            expirations=self.expirations,
+            invalidations=self.invalidations,
+        )
+
+
+user_cache = UserCache()
@@ -1,23 +1,29 @@
 from enum import Enum
 import uuid
-from typing import Optional, Union
+from typing import Any, Iterable, Optional, Union
 
-from fastapi import Depends, Request
+from fastapi import Depends, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_users import (BaseUserManager,
-                           InvalidPasswordException, UUIDIDMixin, schemas)
-from fastapi_users.authentication import JWTStrategy
+                           InvalidPasswordException, UUIDIDMixin, exceptions, schemas)
+from fastapi_users.authentication import AuthenticationBackend, JWTStrategy
 from fastapi_users.db import SQLAlchemyUserDatabase
+from fastapi_users.jwt import decode_jwt, generate_jwt
+import jwt
 from password_validator import PasswordValidator
-from pydantic import Json
+from pydantic import BaseModel, Json, ValidationError
 from sqlalchemy import inspect, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import NO_VALUE, joinedload, selectinload
+from sqlalchemy.orm import NO_VALUE, selectinload
 
 from backend.pydantic_utils import Err, GenericResult, Ok
 
-from .database import get_async_session
+from .database import get_async_session, get_read_session
 from .models import UiFamily, User, UserFamily, user_family_association
+from .passwords import OffloadedPasswordHelper, password_helper
 from .repository import BaseRepository
+from .user_cache import user_cache
 
 validator = PasswordValidator()
 validator.min(8).max(20).uppercase().lowercase().digits()
@@ -36,6 +42,40 @@ class UserUpdate(schemas.BaseUserUpdate):
 
 
 SECRET = "MahKidzR0ckAndTheyNeedGooDHabits"
+# Access tokens carry authorization claims that are trusted until they expire, so they are
+# short-lived and renewed with a refresh token, which re-checks the user in the database
+ACCESS_TOKEN_LIFETIME_SECONDS = 15 * 60
+REFRESH_TOKEN_LIFETIME_SECONDS = 30 * 24 * 3600
+ACCESS_TOKEN_AUDIENCE = ["fastapi-users:auth"]
+REFRESH_TOKEN_AUDIENCE = ["daily-drive:refresh"]
+
+
+class TokenClaims(BaseModel):
+    user_id: uuid.UUID
+    is_superuser: bool = False
+
+
+class BearerRefreshResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+
+
+def decode_token_claims(token: str) -> Optional[TokenClaims]:
+    """
+    Returns the authorization claims of an access token without touching the database,
+    or None if the token is invalid, expired or predates the claims
+    """
+    try:
+        data = decode_jwt(token, SECRET, ACCESS_TOKEN_AUDIENCE)
+    except jwt.PyJWTError:
+        return None
+    if "sub" not in data or "su" not in data:
+        return None
+    try:
+        return TokenClaims(user_id=data["sub"], is_superuser=data["su"])
+    except ValidationError:
+        return None
 
 
 class FamilyRepository(BaseRepository[UserFamily]):
@@ -50,17 +90,67 @@ class FamilyRepository(BaseRepository[UserFamily]):
         ).where(
             user_family_association.c.user_id == user_id
         ).options(
-            joinedload(UserFamily.members)
+            selectinload(UserFamily.members)
         )
 
         result = await self.session.execute(stmt)
-        families = result.unique().scalars().all()
+        families = result.scalars().all()
         return list(families)
 
+    async def get_user_family_ids(self, user_id: uuid.UUID) -> list[uuid.UUID]:
+        stmt = select(user_family_association.c.family_id).where(
+            user_family_association.c.user_id == user_id
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def shares_family(self, user_id: uuid.UUID, other_user_id: uuid.UUID) -> bool:
+        """
+        Returns whether the two users currently belong to a common family
+        """
+        own, other = user_family_association.alias(), user_family_association.alias()
+        stmt = select(other.c.user_id).select_from(
+            own.join(other, own.c.family_id == other.c.family_id)
+        ).where(
+            own.c.user_id == user_id,
+            other.c.user_id == other_user_id,
+        ).limit(1)
+        result = await self.session.execute(stmt)
+        return result.scalar() is not None
+
+    async def get_members_among(self, user_id: uuid.UUID, user_ids: Iterable[uuid.UUID]) -> set[uuid.UUID]:
+        """
+        Returns which of the users currently share a family with user_id
+        """
+        own, other = user_family_association.alias(), user_family_association.alias()
+        stmt = select(other.c.user_id).select_from(
+            own.join(other, own.c.family_id == other.c.family_id)
+        ).where(
+            own.c.user_id == user_id,
+            other.c.user_id.in_(list(user_ids)),
+        ).distinct()
+        result = await self.session.execute(stmt)
+        return set(result.scalars().all())
+
+    async def get_member_ids(self, family_id: uuid.UUID) -> list[uuid.UUID]:
+        stmt = select(user_family_association.c.user_id).where(
+            user_family_association.c.family_id == family_id
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
 
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
+    """
+    Hashes and verifies passwords through password_helper, on its thread pool
+    """
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
+    password_helper: OffloadedPasswordHelper
+
+    def __init__(self, user_db: SQLAlchemyUserDatabase[User, uuid.UUID],
+                 password_helper: OffloadedPasswordHelper = password_helper):
+        super().__init__(user_db, password_helper)
 
     async def on_after_register(self, user: User, request: Optional[Request] = None):
         print(f"User {user.id} has registered.")
@@ -80,6 +170,26 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
             raise InvalidPasswordException(reason="Password is invalid")
         return await super().validate_password(password, user)
 
+    async def authenticate(self, credentials: OAuth2PasswordRequestForm) -> Optional[User]:
+        """
+        Same as BaseUserManager.authenticate, with the password checked off the event loop
+        """
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Run the hasher anyway so unknown emails take as long as wrong passwords
+            await self.password_helper.hash_async(credentials.password)
+            return None
+
+        verified, updated_password_hash = await self.password_helper.verify_and_update_async(
+            credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+        return user
+
     async def create(
         self,
         user_create: schemas.BaseUserCreate,
@@ -89,7 +199,7 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
         user_create.is_superuser = True
         user_create.is_verified = True
         safe = False
-        user = await super().create(user_create, safe, request)
+        user = await self._create(user_create, safe, request)
         return user
 
 
@@ -99,22 +209,162 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
         safe: bool = True,
         request: Optional[Request] = None,
     ) -> User:
-        user = await super().create(user_create, safe, request)
+        user = await self._create(user_create, safe, request)
+        return user
+
+    async def _create(
+        self,
+        user_create: schemas.BaseUserCreate,
+        safe: bool,
+        request: Optional[Request],
+    ) -> User:
+        """
+        Same as BaseUserManager.create, with the password hashed off the event loop
+        """
+        await self.validate_password(user_create.password, user_create)
+
+        existing_user = await self.user_db.get_by_email(user_create.email)
+        if existing_user is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = user_create.create_update_dict() if safe else user_create.create_update_dict_superuser()
+        password = user_dict.pop("password")
+        user_dict["hashed_password"] = await self.password_helper.hash_async(password)
+
+        created_user = await self.user_db.create(user_dict)
+        await self.on_after_register(created_user, request)
+        return created_user
+
+    async def _update(self, user: User, update_dict: dict[str, Any]) -> User:
+        # Hash a new password here so the base class only sees the hash
+        password = update_dict.get("password")
+        if password is not None:
+            await self.validate_password(password, user)
+            update_dict = {field: value for field, value in update_dict.items() if field != "password"}
+            update_dict["hashed_password"] = await self.password_helper.hash_async(password)
+        return await super()._update(user, update_dict)
+
+
+class CachingJWTStrategy(JWTStrategy[User, uuid.UUID]):
+    """
+    JWT strategy resolving the token subject through user_cache before the database.
+
+    Access tokens also carry the is_superuser ("su") claim of the user, see decode_token_claims.
+    Family memberships are not put in the token, they are always checked in the database.
+    """
+
+    def __init__(self, secret: str, lifetime_seconds: int):
+        super().__init__(secret=secret, lifetime_seconds=lifetime_seconds, token_audience=ACCESS_TOKEN_AUDIENCE)
+
+    async def write_token(self, user: User) -> str:
+        data = {
+            "sub": str(user.id),
+            "aud": self.token_audience,
+            "su": user.is_superuser,
+        }
+        return generate_jwt(data, self.encode_key, self.lifetime_seconds, algorithm=self.algorithm)
+
+    async def write_refresh_token(self, user: User) -> str:
+        data = {"sub": str(user.id), "aud": REFRESH_TOKEN_AUDIENCE}
+        return generate_jwt(data, self.encode_key, REFRESH_TOKEN_LIFETIME_SECONDS, algorithm=self.algorithm)
+
+    async def read_refresh_token(
+        self, token: str, user_manager: BaseUserManager[User, uuid.UUID]
+    ) -> Optional[User]:
+        """
+        Returns the active user a refresh token was issued to, always read from the database
+        """
+        try:
+            data = decode_jwt(token, self.decode_key, REFRESH_TOKEN_AUDIENCE, algorithms=[self.algorithm])
+            user = await user_manager.get(user_manager.parse_id(data.get("sub") or ""))
+        except (jwt.PyJWTError, exceptions.InvalidID, exceptions.UserNotExists):
+            return None
+        return user if user.is_active else None
+
+    async def read_token(
+        self, token: Optional[str], user_manager: BaseUserManager[User, uuid.UUID]
+    ) -> Optional[User]:
+        if token is None:
+            return None
+
+        try:
+            data = decode_jwt(token, self.decode_key, self.token_audience, algorithms=[self.algorithm])
+            if data.get("sub") is None:
+                return None
+            user_id = user_manager.parse_id(data["sub"])
+        except (jwt.PyJWTError, exceptions.InvalidID):
+            return None
+
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+
+        try:
+            user = await user_manager.get(user_id)
+        except exceptions.UserNotExists:
+            return None
+        user_cache.put(user)
         return user
 
 
 def get_jwt_strategy():
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600 * 24 * 10)
+    return CachingJWTStrategy(secret=SECRET, lifetime_seconds=ACCESS_TOKEN_LIFETIME_SECONDS)
+
+
+class RefreshingAuthenticationBackend(AuthenticationBackend[User, uuid.UUID]):
+    """
+    Authentication backend whose login response also carries a refresh token
+    """
+
+    async def login(self, strategy: CachingJWTStrategy, user: User) -> Response:
+        return await self.token_response(strategy, user)
+
+    async def token_response(self, strategy: CachingJWTStrategy, user: User) -> Response:
+        response = BearerRefreshResponse(access_token=await strategy.write_token(user),
+                                         refresh_token=await strategy.write_refresh_token(user))
+        return JSONResponse(response.model_dump())
+
+
+class CachedUserDatabase(SQLAlchemyUserDatabase[User, uuid.UUID]):
+    """
+    User database dropping users from user_cache whenever they are updated or deleted,
+    which covers password changes, (de)activation and verification through UserManager
+    """
+
+    async def update(self, user: User, update_dict: dict[str, Any]) -> User:
+        user_cache.invalidate(user.id)
+        user = await super().update(await self._load(user), update_dict)
+        user_cache.invalidate(user.id)
+        return user
+
+    async def delete(self, user: User) -> None:
+        user_cache.invalidate(user.id)
+        await super().delete(await self._load(user))
+
+    async def _load(self, user: User) -> User:
+        """
+        Returns the row of the user in this session. Users served from the cache are detached
+        copies that may be stale, merging one would write its stale fields back, so the row
+        is loaded fresh and only update_dict is applied to it.
+        """
+        loaded = await self.session.get(User, user.id, populate_existing=True)
+        if loaded is None:
+            raise exceptions.UserNotExists()
+        return loaded
 
 
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
-    yield SQLAlchemyUserDatabase(session, User)
+    yield CachedUserDatabase(session, User)
 
 
 async def get_family_repo(session: AsyncSession = Depends(get_async_session)):
     yield FamilyRepository(session)
 
 
+async def get_family_read_repo(session: AsyncSession = Depends(get_read_session)):
+    yield FamilyRepository(session)
+
+
 async def get_user_manager(user_db=Depends(get_user_db)):
     yield UserManager(user_db)
 